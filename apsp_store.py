@@ -0,0 +1,145 @@
+# On-disk, memory-mapped all-pairs shortest path results
+#
+# For a graph with n nodes the store keeps three files named after the graph's content hash:
+#   <hash>.json   = header (format version, node count, dtypes, how the result was computed)
+#   <hash>.dist   = n x n float32 distances, row major (inf where there is no path)
+#   <hash>.parent = n x n int32 parents, row major (-1 where there is no parent)
+# The matrices are opened with np.memmap, so f_w.reconstruct_path reads only the rows it walks and a
+# restarted process reuses a stored result without computing or loading it
+
+import json
+import os
+
+import numpy as np
+
+import f_w
+from compiled_graph import compile_graph
+
+FORMAT_VERSION = 1
+DIST_DTYPE = np.float32
+PARENT_DTYPE = np.int32
+default_directory = "apsp_cache"
+
+
+def store_paths(graph, directory=default_directory):
+    key = compile_graph(graph).fingerprint()
+    base = os.path.join(directory, key)
+    return base + ".json", base + ".dist", base + ".parent"
+
+
+# Memory-mapped (dist, parent) for the graph, or None if nothing valid is stored
+def load_apsp(graph, directory=default_directory):
+    header_path, dist_path, parent_path = store_paths(graph, directory)
+    try:
+        with open(header_path) as header_file:
+            header = json.load(header_file)
+    except (OSError, ValueError):
+        return None
+    n = len(compile_graph(graph))
+    if header.get("version") != FORMAT_VERSION or header.get("nodes") != n:
+        return None
+    dist = np.memmap(dist_path, dtype=DIST_DTYPE, mode='r', shape=(n, n))
+    parent = np.memmap(parent_path, dtype=PARENT_DTYPE, mode='r', shape=(n, n))
+    return dist, parent
+
+
+# Empty temporary dist and parent files for the graph, filled by the writers below and put in place by
+# finish_store
+def open_store(graph, directory):
+    header_path, dist_path, parent_path = store_paths(graph, directory)
+    n = len(compile_graph(graph))
+    os.makedirs(directory, exist_ok=True)
+    dist = np.memmap(dist_path + ".tmp", dtype=DIST_DTYPE, mode='w+', shape=(n, n))
+    parent = np.memmap(parent_path + ".tmp", dtype=PARENT_DTYPE, mode='w+', shape=(n, n))
+    return dist, parent
+
+
+# Data is written to temporary files first and the header last, so a crash never leaves a header pointing
+# at half written matrices
+def finish_store(graph, dist, parent, directory, method):
+    header_path, dist_path, parent_path = store_paths(graph, directory)
+    dist.flush()
+    parent.flush()
+    del dist, parent
+    os.replace(dist_path + ".tmp", dist_path)
+    os.replace(parent_path + ".tmp", parent_path)
+    header = {"version": FORMAT_VERSION, "nodes": len(compile_graph(graph)), "dist_dtype": np.dtype(DIST_DTYPE).str,
+              "parent_dtype": np.dtype(PARENT_DTYPE).str, "method": method}
+    with open(header_path + ".tmp", "w") as header_file:
+        json.dump(header, header_file)
+    os.replace(header_path + ".tmp", header_path)
+
+
+# Writes the result row by row: rows yields (dist_row, parent_row) for sources 0 .. n-1 in order, so a
+# producer never needs the full matrices in memory
+def write_apsp_rows(graph, rows, directory=default_directory, method="unknown"):
+    dist, parent = open_store(graph, directory)
+    n = len(dist)
+    written = 0
+    for source, (dist_row, parent_row) in enumerate(rows):
+        dist[source] = dist_row
+        # Rows from the Python backend use None for a missing parent
+        parent_row = np.asarray(parent_row, dtype=object if isinstance(parent_row, list) else None)
+        parent[source] = np.where(np.equal(parent_row, None), -1, parent_row)
+        written += 1
+    if written != n:
+        raise ValueError(f"Expected {n} rows of results but got {written}")
+    finish_store(graph, dist, parent, directory, method)
+
+
+def save_apsp(graph, dist, parent, directory=default_directory, method="unknown"):
+    write_apsp_rows(graph, zip(dist, parent), directory, method)
+
+
+# Starting distances and parents of the compiled graph, written straight into dist and parent (the store
+# files) a stripe of rows at a time from the CSR arrays, with the same rules as f_w.initial_matrices: an
+# edge of length 0 counts as no edge and the diagonal is always 0
+def write_initial_matrices(compiled, dist, parent, stripe_rows=256):
+    n = len(compiled)
+    offsets = compiled.offsets_np
+    sources = compiled.edge_sources()
+    weights = compiled.weights_np
+    for stripe_start in range(0, n, stripe_rows):
+        stripe_stop = min(stripe_start + stripe_rows, n)
+        dist_stripe = np.full((stripe_stop - stripe_start, n), np.inf, dtype=DIST_DTYPE)
+        parent_stripe = np.full((stripe_stop - stripe_start, n), -1, dtype=PARENT_DTYPE)
+        edges = slice(offsets[stripe_start], offsets[stripe_stop])
+        rows = sources[edges] - stripe_start
+        columns = compiled.indices_np[edges]
+        kept = (weights[edges] != 0) & (rows + stripe_start != columns)
+        dist_stripe[rows[kept], columns[kept]] = weights[edges][kept]
+        parent_stripe[rows[kept], columns[kept]] = sources[edges][kept]
+        diagonal = np.arange(stripe_stop - stripe_start)
+        dist_stripe[diagonal, diagonal + stripe_start] = 0
+        dist[stripe_start:stripe_stop] = dist_stripe
+        parent[stripe_start:stripe_stop] = parent_stripe
+
+
+# Floyd-Warshall run block-wise on the memory-mapped store files themselves, so no dense matrix of the
+# graph is built in memory. backend="numpy" relaxes through one k at a time like f_w.floyd_warshall_numpy,
+# backend="blocked" through block_size at a time like f_w.floyd_warshall_blocked
+def write_floyd_warshall(graph, directory=default_directory, backend="blocked", block_size=64):
+    if backend not in ("numpy", "blocked"):
+        raise ValueError(f"Unknown Floyd-Warshall backend: {backend}")
+    compiled = compile_graph(graph)
+    dist, parent = open_store(graph, directory)
+    write_initial_matrices(compiled, dist, parent)
+    f_w.blocked_relaxation(dist, parent, 1 if backend == "numpy" else block_size)
+    finish_store(graph, dist, parent, directory, method="floyd_warshall_" + backend)
+
+
+# Stored result for the graph, computing and storing it the first time. mode is picked like
+# f_w.all_pairs_shortest_paths; Johnson rows are streamed to disk one source at a time and Floyd-Warshall
+# runs on the store files
+def cached_apsp(graph, directory=default_directory, backend="blocked", mode="auto"):
+    stored = load_apsp(graph, directory)
+    if stored is None:
+        compiled = compile_graph(graph)
+        if mode == "auto":
+            mode = f_w.choose_apsp_mode(len(compiled), compiled.edge_count())
+        if mode == "johnson":
+            write_apsp_rows(graph, f_w.johnson_rows(compiled), directory, method="johnson")
+        else:
+            write_floyd_warshall(graph, directory, backend)
+        stored = load_apsp(graph, directory)
+    return stored
@@ -0,0 +1,359 @@
+# Benchmarks for the pathing algorithms on large generated graphs (no visualization)
+# Run with: python benchmarks.py search --sizes 10000 100000 1000000
+
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from numpy import random
+
+import f_w
+import pathing
+import permutation
+from compiled_graph import compile_graph
+from parallel_engine import ParallelEngine
+from path_service import PathService
+from simulation import Simulation
+from test_helpers import generate_graph, reference_search, reference_sjt_perms
+
+
+# Returns the result of a function, its wall time and the peak traced allocation in bytes.
+# Tracing slows allocation heavy code down a lot, so the time comes from a separate untraced run
+def measure(function, *args):
+    started = time.perf_counter()
+    function(*args)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    result = function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+# Compares peak allocation and time of the path-copying searches with the parent-pointer core.
+# The path-copying DFS keeps a copy of its (very long) path for every stack entry, which grows
+# quadratically, so the reference run is skipped above reference_limit nodes
+def benchmark_search(sizes, strategies, reference_limit):
+    print(f"{'nodes':>9} {'strategy':>9} {'copy peak MB':>13} {'copy s':>8} {'core peak MB':>13} {'core s':>8}")
+    for n in sizes:
+        graph = generate_graph(n)
+        start, goal = 0, len(graph) - 1
+        # Compile outside the measurement, the compiled form is built once per graph and cached
+        compile_graph(graph)
+        for strategy in strategies:
+            path, core_time, core_peak = measure(pathing.search, graph, start, goal, strategy)
+            if len(graph) <= reference_limit.get(strategy, 0):
+                reference_path, copy_time, copy_peak = measure(reference_search, graph, start, goal, strategy)
+                assert reference_path == path, f"{strategy} path differs from the path-copying version"
+                copy_columns = f"{copy_peak / 2 ** 20:>13.1f} {copy_time:>8.2f}"
+            else:
+                copy_columns = f"{'skipped':>13} {'':>8}"
+            print(f"{len(graph):>9} {strategy:>9} {copy_columns} {core_peak / 2 ** 20:>13.1f} {core_time:>8.2f}")
+
+
+# Bytes held by a graph in the nested list format, counting every list, tuple and int object once
+def nested_graph_bytes(graph):
+    seen = set()
+    total = 0
+    objects = [graph]
+    while objects:
+        current = objects.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+        if isinstance(current, (list, tuple)):
+            objects.extend(current)
+    return total
+
+
+# Compares the nested lists with the compiled CSR form: memory, a full Python sweep over every
+# adjacency list, and the same sweep done as one vectorized NumPy gather on the CSR buffers
+def benchmark_csr(sizes):
+    print(f"{'nodes':>9} {'lists MB':>9} {'CSR MB':>8} {'compile s':>10} {'lists sweep s':>14} "
+          f"{'CSR sweep s':>12} {'NumPy gather s':>15}")
+    for n in sizes:
+        graph = generate_graph(n)
+        started = time.perf_counter()
+        compiled = compile_graph(graph)
+        compile_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        total = 0
+        for graph_point in graph:
+            for neighbor in graph_point[1]:
+                total += neighbor
+        list_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        csr_total = 0
+        offsets = compiled.offsets
+        indices = compiled.indices
+        for node in range(len(compiled)):
+            for neighbor in indices[offsets[node]:offsets[node + 1]]:
+                csr_total += neighbor
+        csr_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        neighbors, _ = compiled.expand(np.arange(len(compiled), dtype=np.intc))
+        gather_total = int(neighbors.sum(dtype=np.int64))
+        gather_time = time.perf_counter() - started
+        assert total == csr_total == gather_total
+
+        print(f"{len(graph):>9} {nested_graph_bytes(graph) / 2 ** 20:>9.1f} {compiled.nbytes() / 2 ** 20:>8.1f} "
+              f"{compile_time:>10.2f} {list_time:>14.3f} {csr_time:>12.3f} {gather_time:>15.3f}")
+
+
+# Nodes expanded and time for Dijkstra and A* on the start -> target -> exit route of generated graphs
+def benchmark_astar(sizes):
+    print(f"{'nodes':>9} {'Dijkstra expanded':>18} {'Dijkstra s':>11} {'A* expanded':>12} {'A* s':>8}")
+    for n in sizes:
+        graph = generate_graph(n)
+        compile_graph(graph).weights
+        target_node = len(graph) // 2 + int(len(graph) ** 0.5) // 3
+        row = []
+        for strategy in ["dijkstra", "astar"]:
+            stats = {}
+            started = time.perf_counter()
+            pathing.search(graph, 0, target_node, strategy, stats=stats)
+            pathing.search(graph, target_node, len(graph) - 1, strategy, stats=stats)
+            row.append((stats["expanded"], time.perf_counter() - started))
+        print(f"{len(graph):>9} {row[0][0]:>18} {row[0][1]:>11.2f} {row[1][0]:>12} {row[1][1]:>8.2f}")
+
+
+# Floyd-Warshall backends on the weighted adjacency matrix of generated graphs. The pure Python
+# triple loop is only run up to python_limit nodes (about 15 seconds at 500)
+def benchmark_floyd_warshall(sizes, backends, python_limit):
+    print(f"{'nodes':>6} " + " ".join(f"{backend + ' s':>12}" for backend in backends))
+    for n in sizes:
+        graph_matrix = f_w.compiled_to_matrix(compile_graph(generate_graph(n)))
+        timings = []
+        for backend in backends:
+            if backend == "python" and len(graph_matrix) > python_limit:
+                timings.append(f"{'skipped':>12}")
+                continue
+            started = time.perf_counter()
+            f_w.floyd_warshall(graph_matrix, backend=backend)
+            timings.append(f"{time.perf_counter() - started:>12.2f}")
+        print(f"{len(graph_matrix):>6} " + " ".join(timings))
+
+
+# All-pairs rows and a batch of route queries through the process pool engine with different worker counts
+def benchmark_parallel(n, worker_counts, route_count):
+    graph = compile_graph(generate_graph(n))
+    rng = random.default_rng(0)
+    routes = [tuple(int(node) for node in rng.integers(0, len(graph), size=3)) for _ in range(route_count)]
+    print(f"{'workers':>8} {'APSP s':>8} {'routes s':>9}")
+    for workers in worker_counts:
+        with ParallelEngine(graph, workers=workers) as engine:
+            started = time.perf_counter()
+            for _ in engine.apsp_rows():
+                pass
+            apsp_time = time.perf_counter() - started
+            started = time.perf_counter()
+            list(engine.dijkstra_paths(routes))
+            routes_time = time.perf_counter() - started
+        print(f"{workers:>8} {apsp_time:>8.2f} {routes_time:>9.2f}")
+
+
+# Time to run through all n! SJT permutations: the original generator, Even's speedup with a copy per
+# permutation (sjt_perms), with one reused view, and with only the transposition indices.
+# The original generator is only run up to reference_limit
+def benchmark_sjt(sizes, reference_limit):
+    generators = [("copies", permutation.sjt_perms),
+                  ("view", lambda n: permutation.sjt_stream(n, "view")),
+                  ("swaps", lambda n: permutation.sjt_stream(n, "swaps"))]
+    print(f"{'n':>3} {'perms':>10} {'original s':>11} " + " ".join(f"{name + ' s':>9}" for name, _ in generators))
+    for n in sizes:
+        if n <= reference_limit:
+            started = time.perf_counter()
+            for _ in reference_sjt_perms(n):
+                pass
+            reference_column = f"{time.perf_counter() - started:>11.2f}"
+        else:
+            reference_column = f"{'skipped':>11}"
+        timings = []
+        for _, generator in generators:
+            started = time.perf_counter()
+            for _ in generator(n):
+                pass
+            timings.append(f"{time.perf_counter() - started:>9.2f}")
+        print(f"{n:>3} {math.factorial(n):>10} {reference_column} " + " ".join(timings))
+
+
+# Permutation-based Hamiltonian cycle check on generated graphs: every edge of every SJT permutation
+# checked with has_edge (the original has_ham_cycle) vs the incremental missing edge count
+def benchmark_ham_permutations(sizes):
+    print(f"{'nodes':>6} {'cycles':>7} {'full check s':>13} {'incremental s':>14}")
+    for n in sizes:
+        graph = compile_graph(generate_graph(n, diagonal_chance=1))
+        started = time.perf_counter()
+        expected = []
+        for perm in permutation.sjt_perms(len(graph) - 2):
+            cycle = [0] + perm + [len(graph) - 1]
+            if all(graph.has_edge(cycle[i], cycle[i + 1]) for i in range(len(cycle) - 1)):
+                expected.append(cycle)
+        full_time = time.perf_counter() - started
+        started = time.perf_counter()
+        cycles = list(permutation.sjt_ham_cycles(graph))
+        incremental_time = time.perf_counter() - started
+        assert cycles == expected
+        print(f"{len(graph):>6} {len(cycles):>7} {full_time:>13.2f} {incremental_time:>14.2f}")
+
+
+# The incremental SJT check sharded across the process pool with different worker counts
+def benchmark_parallel_ham(n, worker_counts):
+    graph = compile_graph(generate_graph(n, diagonal_chance=1))
+    started = time.perf_counter()
+    expected = list(permutation.sjt_ham_cycles(graph))
+    print(f"{len(graph)} nodes, {len(expected)} cycles, sequential {time.perf_counter() - started:.2f} s")
+    print(f"{'workers':>8} {'seconds':>8}")
+    for workers in worker_counts:
+        with ParallelEngine(graph, workers=workers) as engine:
+            started = time.perf_counter()
+            cycles = list(engine.sjt_ham_cycles())
+            elapsed = time.perf_counter() - started
+        assert cycles == expected
+        print(f"{workers:>8} {elapsed:>8.2f}")
+
+
+# Load generator for path_service: clients concurrent connections each send requests_per_client route
+# queries (mixed algorithms, random targets) one after the other and time every answer. Starts a local
+# service on a generated graph unless the port of a running one is given (then graph names its graph and
+# nodes must be its node count)
+async def load_service(clients, requests_per_client, nodes, host, port, graph):
+    service = None
+    if port is None:
+        graph = "generated"
+        service = PathService({graph: generate_graph(nodes)})
+        server = await service.serve(host, 0)
+        port = server.sockets[0].getsockname()[1]
+    node_count = nodes if service is None else len(service.graphs[graph])
+    latencies = []
+
+    async def client(client_index):
+        rng = random.default_rng(client_index)
+        reader, writer = await asyncio.open_connection(host, port)
+        for request_index in range(requests_per_client):
+            request = {"id": request_index, "graph": graph, "op": "path", "start": 0,
+                       "target": int(rng.integers(1, node_count - 1)), "exit": node_count - 1,
+                       "algorithm": ["dijkstra", "dijkstra", "astar", "bfs"][request_index % 4]}
+            started = time.perf_counter()
+            writer.write((json.dumps(request) + "\n").encode())
+            await writer.drain()
+            await reader.readline()
+            latencies.append(time.perf_counter() - started)
+        writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(index) for index in range(clients)))
+    elapsed = time.perf_counter() - started
+    p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+    print(f"{len(latencies)} requests from {clients} clients in {elapsed:.2f} s ({len(latencies) / elapsed:.0f}/s), "
+          f"client latency p50 {p50:.1f} ms, p99 {p99:.1f} ms")
+    if service is not None:
+        print("service metrics:", service.metrics())
+        await service.close()
+
+
+# Milliseconds per simulation step for racers players all moving at once over a generated graph, each
+# along the Dijkstra route to a random target
+def benchmark_simulation(nodes, racer_counts, steps):
+    graph = compile_graph(generate_graph(nodes))
+    rng = random.default_rng(0)
+    targets = rng.integers(1, len(graph) - 1, size=64).tolist()
+    routes = pathing.get_dijkstra_paths(graph, [(0, target, len(graph) - 1) for target in targets])
+    print(f"{'racers':>7} {'ms/step':>8}")
+    for racers in racer_counts:
+        simulation = Simulation(100.0, 1 / 120, relay=False)
+        simulation.load(graph.coordinates, [routes[index % len(routes)] for index in range(racers)])
+        started = time.perf_counter()
+        for _ in range(steps):
+            simulation.step()
+        print(f"{racers:>7} {(time.perf_counter() - started) / steps * 1000:>8.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pathing benchmarks on generated graphs")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    search_parser = subparsers.add_parser("search", help="path-copying vs parent-pointer search allocations")
+    search_parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    search_parser.add_argument("--strategies", nargs="+", default=["dfs", "bfs", "dijkstra"])
+    search_parser.add_argument("--dfs-reference-limit", type=int, default=100_000)
+    search_parser.add_argument("--reference-limit", type=int, default=1_000_000)
+
+    csr_parser = subparsers.add_parser("csr", help="nested lists vs compiled CSR graph memory and neighbor sweeps")
+    csr_parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+
+    astar_parser = subparsers.add_parser("astar", help="nodes expanded by Dijkstra vs A*")
+    astar_parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+
+    floyd_warshall_parser = subparsers.add_parser("fw", help="Floyd-Warshall backends")
+    floyd_warshall_parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 2000])
+    floyd_warshall_parser.add_argument("--backends", nargs="+", default=["python", "numpy", "blocked"])
+    floyd_warshall_parser.add_argument("--python-limit", type=int, default=600)
+
+    parallel_parser = subparsers.add_parser("parallel", help="process pool APSP and route batches")
+    parallel_parser.add_argument("--nodes", type=int, default=2000)
+    parallel_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parallel_parser.add_argument("--routes", type=int, default=2000)
+
+    sjt_parser = subparsers.add_parser("sjt", help="SJT permutation generators (n up to 12 takes minutes)")
+    sjt_parser.add_argument("--sizes", type=int, nargs="+", default=[8, 9, 10])
+    sjt_parser.add_argument("--reference-limit", type=int, default=10)
+
+    ham_parser = subparsers.add_parser("ham", help="full vs incremental edge checks over SJT permutations")
+    ham_parser.add_argument("--sizes", type=int, nargs="+", default=[9, 12])
+
+    parallel_ham_parser = subparsers.add_parser("ham-parallel", help="SJT cycle check sharded over processes")
+    parallel_ham_parser.add_argument("--nodes", type=int, default=12)
+    parallel_ham_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+
+    service_parser = subparsers.add_parser("service", help="load generator for path_service")
+    service_parser.add_argument("--clients", type=int, default=50)
+    service_parser.add_argument("--requests", type=int, default=40)
+    service_parser.add_argument("--nodes", type=int, default=2500)
+    service_parser.add_argument("--host", default="127.0.0.1")
+    service_parser.add_argument("--port", type=int, help="port of a running service (a local one is started otherwise)")
+    service_parser.add_argument("--graph", default="graph_data[2]", help="graph name on a running service")
+
+    simulation_parser = subparsers.add_parser("simulation", help="vectorized steps for many racers at once")
+    simulation_parser.add_argument("--nodes", type=int, default=10_000)
+    simulation_parser.add_argument("--racers", type=int, nargs="+", default=[6, 100, 1000, 10_000])
+    simulation_parser.add_argument("--steps", type=int, default=1000)
+
+    arguments = parser.parse_args()
+    if arguments.benchmark == "search":
+        reference_limit = {"dfs": arguments.dfs_reference_limit,
+                           "bfs": arguments.reference_limit,
+                           "dijkstra": arguments.reference_limit}
+        benchmark_search(arguments.sizes, arguments.strategies, reference_limit)
+    elif arguments.benchmark == "csr":
+        benchmark_csr(arguments.sizes)
+    elif arguments.benchmark == "astar":
+        benchmark_astar(arguments.sizes)
+    elif arguments.benchmark == "fw":
+        benchmark_floyd_warshall(arguments.sizes, arguments.backends, arguments.python_limit)
+    elif arguments.benchmark == "parallel":
+        benchmark_parallel(arguments.nodes, arguments.workers, arguments.routes)
+    elif arguments.benchmark == "sjt":
+        benchmark_sjt(arguments.sizes, arguments.reference_limit)
+    elif arguments.benchmark == "ham":
+        benchmark_ham_permutations(arguments.sizes)
+    elif arguments.benchmark == "ham-parallel":
+        benchmark_parallel_ham(arguments.nodes, arguments.workers)
+    elif arguments.benchmark == "service":
+        asyncio.run(load_service(arguments.clients, arguments.requests, arguments.nodes, arguments.host,
+                                 arguments.port, arguments.graph))
+    elif arguments.benchmark == "simulation":
+        benchmark_simulation(arguments.nodes, arguments.racers, arguments.steps)
+
+
+if __name__ == "__main__":
+    main()
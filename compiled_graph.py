@@ -0,0 +1,309 @@
+# Compiled (CSR) form of a graph from graph_data
+#
+# graph_data[a][b] = [(x, y), [neighbors]] is easy to write by hand but every lookup chases several
+# Python objects. A CompiledGraph stores the same graph in flat buffers:
+#   offsets[b]                      = index in indices where the neighbors of node b start
+#   indices[offsets[b]:offsets[b+1]] = adjacency list of node b, in the same order as graph_data
+#   coordinates[b]                  = x-y coordinates of node b as float64
+#   weights[e]                      = Euclidean length of the edge stored at indices[e]
+#   adjacency_bits()[b]             = Python int with bit c set for every edge b -> c
+# offsets, indices and weights are array buffers (fast to index from Python) with zero-copy NumPy views.
+# Weights are computed in one vectorized pass the first time they are needed and dropped whenever the
+# coordinates change. The adjacency bitsets take n * n / 8 bytes, so edge tests only use them
+# automatically on graphs up to bitset_node_limit nodes and fall back to scanning the adjacency list
+
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from itertools import chain
+
+import numpy as np
+
+bitset_node_limit = 8192
+
+
+class CompiledGraph:
+
+    def __init__(self, graph):
+        self.source = graph
+        offsets = array('i', [0])
+        indices = array('i')
+        for graph_point in graph:
+            indices.extend(graph_point[1])
+            offsets.append(len(indices))
+        self.offsets = offsets
+        self.indices = indices
+        self.offsets_np = np.frombuffer(offsets, dtype=np.intc)
+        self.indices_np = np.frombuffer(indices, dtype=np.intc)
+        self.coordinates = self.read_coordinates(graph)
+        # The coordinate tuples of the source (the same objects, so this costs one reference per node),
+        # compared in matches() without converting the coordinates again
+        self._source_points = [tuple(graph_point[0]) for graph_point in graph]
+        self._weights = None
+        self._weights_np = None
+        self._reverse = None
+        self._undirected = None
+        self._adjacency_bits = None
+        self._fingerprint = None
+
+    # Builds a CompiledGraph straight from CSR buffers (NumPy arrays or anything array() accepts).
+    # copy=False wraps NumPy arrays that already have the CSR dtypes (intc offsets and indices, float64
+    # coordinates and weights) without copying them, with memoryviews in place of the array buffers, for
+    # example to use arrays in shared memory
+    @classmethod
+    def from_csr(cls, offsets, indices, coordinates, source=None, weights=None, copy=True):
+        compiled = cls.__new__(cls)
+        compiled.source = source
+        compiled._source_points = None
+        if copy:
+            compiled.offsets = array('i', np.asarray(offsets, dtype=np.intc).tobytes())
+            compiled.indices = array('i', np.asarray(indices, dtype=np.intc).tobytes())
+            compiled.offsets_np = np.frombuffer(compiled.offsets, dtype=np.intc)
+            compiled.indices_np = np.frombuffer(compiled.indices, dtype=np.intc)
+            compiled.coordinates = np.array(coordinates, dtype=np.float64).reshape(len(compiled.offsets) - 1, 2)
+        else:
+            compiled.offsets_np = offsets
+            compiled.indices_np = indices
+            compiled.offsets = memoryview(offsets)
+            compiled.indices = memoryview(indices)
+            compiled.coordinates = coordinates.reshape(len(offsets) - 1, 2)
+        compiled._weights = None
+        compiled._weights_np = None
+        if weights is not None and copy:
+            compiled._weights = array('d', np.asarray(weights, dtype=np.float64).tobytes())
+            compiled._weights_np = np.frombuffer(compiled._weights, dtype=np.float64)
+        elif weights is not None:
+            compiled._weights = memoryview(weights)
+            compiled._weights_np = weights
+        compiled._reverse = None
+        compiled._undirected = None
+        compiled._adjacency_bits = None
+        compiled._fingerprint = None
+        return compiled
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    # Same shape as a graph_data entry so code written against the nested lists keeps working
+    def __getitem__(self, node):
+        return tuple(self.coordinates[node].tolist()), self.neighbors(node)
+
+    def neighbors(self, node):
+        return self.indices[self.offsets[node]:self.offsets[node + 1]]
+
+    def degree(self, node):
+        return self.offsets[node + 1] - self.offsets[node]
+
+    def has_edge(self, node, other_node):
+        if self._adjacency_bits is not None or len(self) <= bitset_node_limit:
+            return self.adjacency_bits()[node] >> other_node & 1 == 1
+        return self.lists_edge(node, other_node)
+
+    # Edge test on the CSR slice of node alone, O(degree) and without building the bitsets, for one-off
+    # checks such as the postconditions of a route
+    def lists_edge(self, node, other_node):
+        return other_node in self.indices[self.offsets[node]:self.offsets[node + 1]]
+
+    # One bitset per node, built on first use: edge tests are a shift and a mask, and neighborhoods can
+    # be intersected or merged a machine word at a time (adjacency_bits()[a] & adjacency_bits()[b])
+    def adjacency_bits(self):
+        if self._adjacency_bits is None:
+            row_bytes = (len(self) + 7) // 8
+            bits = []
+            for node in range(len(self)):
+                row = np.zeros(row_bytes * 8, dtype=np.bool_)
+                row[self.indices_np[self.offsets[node]:self.offsets[node + 1]]] = True
+                bits.append(int.from_bytes(np.packbits(row, bitorder='little').tobytes(), 'little'))
+            self._adjacency_bits = bits
+        return self._adjacency_bits
+
+    # Nodes that both node and other_node have an edge to
+    def common_neighbors(self, node, other_node):
+        shared = self.adjacency_bits()[node] & self.adjacency_bits()[other_node]
+        common = []
+        while shared:
+            bit = shared & -shared
+            common.append(bit.bit_length() - 1)
+            shared ^= bit
+        return common
+
+    def edge_count(self):
+        return len(self.indices)
+
+    # Source node of every CSR edge, lined up with indices
+    def edge_sources(self):
+        return np.repeat(np.arange(len(self), dtype=np.intc), np.diff(self.offsets_np))
+
+    # Concatenated neighbors of every node in frontier (in frontier order) and the node each came from
+    def expand(self, frontier):
+        starts = self.offsets_np[frontier]
+        lengths = self.offsets_np[frontier + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.intc), np.empty(0, dtype=np.intc)
+        # Position of each gathered edge: its node's start plus its rank within that node's list
+        block_starts = np.cumsum(lengths) - lengths
+        positions = np.arange(total) - np.repeat(block_starts - starts, lengths)
+        return self.indices_np[positions], np.repeat(frontier, lengths)
+
+    # Same nodes with every edge pointing the other way, used to search backwards from a goal. Built once
+    # with a stable sort so each reversed adjacency list is in increasing order of the original source
+    def reverse(self):
+        if self._reverse is None:
+            order = np.argsort(self.indices_np, kind='stable')
+            counts = np.bincount(self.indices_np, minlength=len(self))
+            offsets = np.concatenate(([0], np.cumsum(counts)))
+            self._reverse = CompiledGraph.from_csr(offsets, self.edge_sources()[order], self.coordinates)
+            self._reverse._reverse = self
+        return self._reverse
+
+    # True when every edge u -> v also appears as v -> u, then one search tree serves both directions
+    def is_undirected(self):
+        if self._undirected is None:
+            sources = self.edge_sources().astype(np.int64)
+            targets = self.indices_np.astype(np.int64)
+            self._undirected = bool(np.array_equal(np.sort(sources * len(self) + targets),
+                                                   np.sort(targets * len(self) + sources)))
+        return self._undirected
+
+    # Every connected pair of nodes once, as rows (smaller node, larger node) in increasing order, however
+    # many directions the edge is stored in. Self loops are left out
+    def undirected_edges(self):
+        sources = self.edge_sources().astype(np.int64)
+        targets = self.indices_np.astype(np.int64)
+        keys = np.unique(np.minimum(sources, targets) * len(self) + np.maximum(sources, targets))
+        edges = np.stack((keys // max(len(self), 1), keys % max(len(self), 1)), axis=1)
+        return edges[edges[:, 0] != edges[:, 1]]
+
+    @staticmethod
+    def read_coordinates(graph):
+        return np.array([graph_point[0] for graph_point in graph], dtype=np.float64).reshape(len(graph), 2)
+
+    # Edge weight table, lined up with indices
+    @property
+    def weights(self):
+        if self._weights is None:
+            self.compute_weights()
+        return self._weights
+
+    @property
+    def weights_np(self):
+        if self._weights_np is None:
+            self.compute_weights()
+        return self._weights_np
+
+    def compute_weights(self):
+        differences = self.coordinates[self.indices_np] - self.coordinates[self.edge_sources()]
+        lengths = np.sqrt(differences[:, 0] * differences[:, 0] + differences[:, 1] * differences[:, 1])
+        self._weights = array('d', lengths.tobytes())
+        self._weights_np = np.frombuffer(self._weights, dtype=np.float64)
+
+    # Moves every node (coordinates has one (x, y) row per node) and invalidates the weights
+    def set_coordinates(self, coordinates):
+        coordinates = np.array(coordinates, dtype=np.float64).reshape(len(self), 2)
+        self.coordinates = coordinates
+        self._source_points = None
+        self._weights = None
+        self._weights_np = None
+        self._reverse = None
+        self._fingerprint = None
+
+    def set_node_coordinates(self, node, coordinates):
+        self.coordinates[node] = coordinates
+        self._source_points = None
+        self._weights = None
+        self._weights_np = None
+        self._reverse = None
+        self._fingerprint = None
+
+    # Re-reads the coordinates from the nested lists this graph was compiled from, after nodes in
+    # graph_data were moved. Returns True if anything changed (the weights are then invalidated)
+    def sync_coordinates(self):
+        coordinates = self.read_coordinates(self.source)
+        if np.array_equal(coordinates, self.coordinates):
+            return False
+        self.set_coordinates(coordinates)
+        self._source_points = [tuple(graph_point[0]) for graph_point in self.source]
+        return True
+
+    # Content hash of the graph (adjacency and coordinates), equal for equal graphs in any process.
+    # Computed once and kept until the coordinates change
+    def fingerprint(self):
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            digest.update(len(self).to_bytes(8, 'little'))
+            digest.update(self.offsets_np.astype('<i4').tobytes())
+            digest.update(self.indices_np.astype('<i4').tobytes())
+            digest.update(self.coordinates.astype('<f8').tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    # True if the nested lists graph still has exactly these nodes, coordinates and adjacency lists. The
+    # comparisons run over flat buffers (about a third of the time compiling takes), so it can run before
+    # every search
+    def matches(self, graph):
+        return self.adjacency_matches(graph) and self.coordinates_match(graph)
+
+    def adjacency_matches(self, graph):
+        if len(graph) != len(self):
+            return False
+        neighbor_lists = [graph_point[1] for graph_point in graph]
+        return array('i', map(len, neighbor_lists)) == array('i', np.diff(self.offsets_np).tobytes()) and \
+            np.array_equal(np.fromiter(chain.from_iterable(neighbor_lists), np.intc, len(self.indices)),
+                           self.indices_np)
+
+    def coordinates_match(self, graph):
+        if self._source_points is not None:
+            return [tuple(graph_point[0]) for graph_point in graph] == self._source_points
+        return np.array_equal(self.read_coordinates(graph), self.coordinates)
+
+    def nbytes(self):
+        total = self.offsets.itemsize * len(self.offsets) + self.indices.itemsize * len(self.indices) + \
+                self.coordinates.nbytes
+        if self._weights is not None:
+            total += self._weights.itemsize * len(self._weights)
+        return total
+
+
+# Compiled graphs are cached per graph object so every search on the same graph reuses one build.
+# The cache keeps a reference to the source list (so its id cannot be reused) and is bounded so that
+# cycling through thousands of graphs does not keep all of them alive. The lock keeps the cache
+# consistent when searches run in several threads (two threads may still compile the same graph once each)
+compiled_cache_size = 32
+_compiled_cache = OrderedDict()
+_compiled_cache_lock = threading.Lock()
+
+
+# The cached form is checked against the nested lists on every call, so no search runs on a stale graph:
+# edited adjacency lists compile the graph again and moved nodes only refresh coordinates and weights.
+# verify=False skips the check, for callers that run every frame and only need the graph last shown
+def compile_graph(graph, verify=True):
+    if isinstance(graph, CompiledGraph):
+        return graph
+    key = id(graph)
+    with _compiled_cache_lock:
+        cached = _compiled_cache.get(key)
+        if cached is not None and cached[0] is graph:
+            _compiled_cache.move_to_end(key)
+    if cached is not None and cached[0] is graph:
+        compiled = cached[1]
+        if not verify:
+            return compiled
+        if compiled.adjacency_matches(graph):
+            # Nodes that were only moved keep their compiled graph, with the weights recomputed
+            if not compiled.coordinates_match(graph):
+                compiled.sync_coordinates()
+            return compiled
+    compiled = CompiledGraph(graph)
+    with _compiled_cache_lock:
+        _compiled_cache[key] = (graph, compiled)
+        while len(_compiled_cache) > compiled_cache_size:
+            _compiled_cache.popitem(last=False)
+    return compiled
+
+
+# Drops the cached compiled form of a graph, to free it before the cache would
+def invalidate_compiled_graph(graph):
+    with _compiled_cache_lock:
+        _compiled_cache.pop(id(graph), None)
@@ -9,7 +9,8 @@ player_data = [
     ["Random", "2.png", colors.ORANGE],
     ["DFS", "3.png", colors.PURPLE],
     ["BFS", "4.png", colors.BLUE],
-    ["Dijkstra", "5.png", colors.GREEN]
+    ["Dijkstra", "5.png", colors.GREEN],
+    ["A*", "6.png", colors.RED]
 ]
 
 display_size_right = 400
@@ -17,4 +18,13 @@ display_size_bottom = 100
 display_size_top = 0
 display_size_left = 0
 graph_padding = 60
+# Limits of the graph view zoom, and the most node labels drawn at once (none are drawn when more nodes
+# than this are on screen)
+min_zoom = 0.5
+max_zoom = 200
+max_visible_labels = 200
 player_speed = 7
+# Seconds of game time the players move per simulation step, whatever the frame rate
+simulation_timestep = 1 / 120
+# Print the mean and percentile time of the game updates every 5 seconds
+report_frame_times = False
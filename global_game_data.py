@@ -3,3 +3,7 @@ current_player_index = 0
 player_objects = []
 graph_paths = []
 target_node = []
+nodes_expanded = {}
+# Zoom factor and pan offset in window pixels of the graph view (relative_display_functions.zoom_view)
+view_zoom = 1.0
+view_pan = [0.0, 0.0]
@@ -6,13 +6,13 @@ import global_game_data
 import colors
 import relative_display_functions
 import pathing
+from compiled_graph import compile_graph
+from render_state import RenderState
+from graph_renderer import GraphRenderer
 
 
 class Graph:
-    graph_lines = []
-    graph_points = []
-    graph_line_coordinates = []
-    graph_point_coordinates = []
+    graph_labels = {}
     display_size_scoreboard = 400
     display_size_bottom_controls = 100
     graph_padding = 60
@@ -31,6 +31,8 @@ class Graph:
         self.group3 = pyglet.graphics.Group(order=3)
         self.group4 = pyglet.graphics.Group(order=4)
         self.group5 = pyglet.graphics.Group(order=5)
+        self.render_state = RenderState()
+        self.renderer = GraphRenderer(batch, edge_order=1, node_order=2)
         pathing.set_current_graph_paths()
         self.set_up_graph()
 
@@ -49,78 +51,53 @@ class Graph:
                                         group=self.group5)
 
     def set_up_graph(self):
-        for graph_line in self.graph_lines:
-            graph_line.delete()
-        for graph_point in self.graph_points:
-            graph_point.delete()
-        self.graph_lines.clear()
-        self.graph_points.clear()
-        self.graph_line_coordinates.clear()
-        self.graph_point_coordinates.clear()
-        # Draw lines for connections between vertices
-        for graph_point in graph_data.graph_data[global_game_data.current_graph_index]:
-            for other_point_index in graph_point[1]:
-                start_x = graph_point[0][0]
-                start_y = graph_point[0][1]
-                other_point = graph_data.graph_data[global_game_data.current_graph_index][other_point_index]
-                end_x = other_point[0][0]
-                end_y = other_point[0][1]
-                self.graph_line_coordinates.append((start_x, start_y, end_x, end_y))
-                line = pyglet.shapes.Line(start_x, start_y, end_x, end_y,
-                                          color=colors.WHITE[colors.SHAPE_INDEX],
-                                          width=3, batch=self.batch, group=self.group1)
-                self.graph_lines.append(line)
-        # Draw graph points and add lables for each vertex
-        for index, graph_point in enumerate(graph_data.graph_data[global_game_data.current_graph_index]):
-            x_coordinate = graph_point[0][0]
-            y_coordinate = graph_point[0][1]
-            self.graph_point_coordinates.append((x_coordinate, y_coordinate))
-            outer_circle = pyglet.shapes.Circle(x_coordinate, y_coordinate, 25,
-                                                color=colors.YELLOW[colors.SHAPE_INDEX],
-                                                batch=self.batch,
-                                                group=self.group2)
-            self.graph_points.append(outer_circle)
-            inner_circle = pyglet.shapes.Circle(x_coordinate, y_coordinate, 20,
-                                                color=colors.WHITE[colors.SHAPE_INDEX],
-                                                batch=self.batch,
-                                                group=self.group3)
-            self.graph_points.append(inner_circle)
-            circle_label = pyglet.text.Label(str(index), font_name='Arial', font_size=20,
-                                             x=x_coordinate, y=y_coordinate,
-                                             anchor_x='center', anchor_y='center',
-                                             color=colors.BLACK[colors.TEXT_INDEX],
-                                             batch=self.batch, group=self.group4)
-            self.graph_points.append(circle_label)
-            # Set location for target object
-            if index == global_game_data.target_node[global_game_data.current_graph_index]:
-                self.target_x = x_coordinate
-                self.target_y = y_coordinate
-            # Set location for start object
-            if index == 0:
-                self.start_x = x_coordinate
-                self.start_y = y_coordinate
-            # Set location for end object
-            if index == len(graph_data.graph_data[global_game_data.current_graph_index]) - 1:
-                self.end_x = x_coordinate
-                self.end_y = y_coordinate
-
+        for graph_label in self.graph_labels.values():
+            graph_label.delete()
+        self.graph_labels.clear()
+        # The new graph has not been positioned yet
+        self.render_state.invalidate()
+        compiled = compile_graph(graph_data.graph_data[global_game_data.current_graph_index])
+        # Lines for connections between vertices and the graph points are drawn by the renderer, only
+        # for the part of the graph in view (see resize_graph)
+        self.renderer.set_graph(compiled)
+        if len(compiled):
+            # Set location for target, start and end objects
+            self.target_x, self.target_y = \
+                compiled.coordinates[global_game_data.target_node[global_game_data.current_graph_index]].tolist()
+            self.start_x, self.start_y = compiled.coordinates[0].tolist()
+            self.end_x, self.end_y = compiled.coordinates[-1].tolist()
+
+    # Labels for the visible nodes, created when a node comes into view and deleted when it leaves. When more
+    # than config_data.max_visible_labels nodes are visible they could not be read anyway, so none are drawn
+    def update_labels(self, transform, nodes):
+        if len(nodes) > config_data.max_visible_labels:
+            nodes = nodes[:0]
+        shown = set(nodes.tolist())
+        for node in [node for node in self.graph_labels if node not in shown]:
+            self.graph_labels.pop(node).delete()
+        points = transform.apply(self.renderer.coordinates[nodes]).tolist()
+        for node, (x_coordinate, y_coordinate) in zip(nodes.tolist(), points):
+            if node in self.graph_labels:
+                self.graph_labels[node].position = (x_coordinate, y_coordinate, 0)
+            else:
+                self.graph_labels[node] = pyglet.text.Label(str(node), font_name='Arial', font_size=20,
+                                                            x=x_coordinate, y=y_coordinate,
+                                                            anchor_x='center', anchor_y='center',
+                                                            color=colors.BLACK[colors.TEXT_INDEX],
+                                                            batch=self.batch, group=self.group4)
+
+    # Runs when the window size, zoom or pan changes: nodes and edges in view are found with the spatial grid
+    # of the renderer, moved with one NumPy transform and written to the vertex lists in one call each
     def resize_graph(self):
-        for index, graph_point in enumerate(self.graph_points):
-            coordinates = self.graph_point_coordinates[index // 3]
-            graph_point.x = relative_display_functions.get_relative_graph_x(coordinates[0])
-            graph_point.y = relative_display_functions.get_relative_graph_y(coordinates[1])
-        for index, graph_line in enumerate(self.graph_lines):
-            coordinates = self.graph_line_coordinates[index]
-            graph_line.x = relative_display_functions.get_relative_graph_x(coordinates[0])
-            graph_line.y = relative_display_functions.get_relative_graph_y(coordinates[1])
-            graph_line.x2 = relative_display_functions.get_relative_graph_x(coordinates[2])
-            graph_line.y2 = relative_display_functions.get_relative_graph_y(coordinates[3])
-        self.target.x = relative_display_functions.get_relative_graph_x(self.target_x) - self.target.width // 2
-        self.target.y = relative_display_functions.get_relative_graph_y(self.target_y) - self.target.height // 2
-        self.start.x = relative_display_functions.get_relative_graph_x(self.start_x) - self.start.width // 2
-        self.start.y = relative_display_functions.get_relative_graph_y(self.start_y) - self.start.height // 2
-        self.end.x = relative_display_functions.get_relative_graph_x(self.end_x) - self.end.width // 2
-        self.end.y = relative_display_functions.get_relative_graph_y(self.end_y) - self.end.height // 2
+        transform = relative_display_functions.get_viewport_transform()
+        nodes = self.renderer.update_view(transform)
+        self.update_labels(transform, nodes)
+        self.target.x = transform.x(self.target_x) - self.target.width // 2
+        self.target.y = transform.y(self.target_y) - self.target.height // 2
+        self.start.x = transform.x(self.start_x) - self.start.width // 2
+        self.start.y = transform.y(self.start_y) - self.start.height // 2
+        self.end.x = transform.x(self.end_x) - self.end.width // 2
+        self.end.y = transform.y(self.end_y) - self.end.height // 2
 
     def draw_new_path_lines(self):
         for line in self.path_lines:
@@ -136,44 +113,59 @@ class Graph:
             current_objective = global_game_data.player_objects[global_game_data.current_player_index].current_objective
 
             if 0 <= current_objective < len(current_path):
+                transform = relative_display_functions.get_viewport_transform()
+                compiled = compile_graph(graph_data.graph_data[global_game_data.current_graph_index], verify=False)
+                # Window positions of the objectives still ahead, in one transform
+                objectives = transform.apply(compiled.coordinates[current_path[current_objective:]]).tolist()
+
                 # Draw line from player to next objective
-                x_of_current_objective = relative_display_functions.get_relative_graph_x(
-                    graph_data.graph_data[global_game_data.current_graph_index][current_path[current_objective]][0][0])
-                y_of_current_objective = relative_display_functions.get_relative_graph_y(
-                    graph_data.graph_data[global_game_data.current_graph_index][current_path[current_objective]][0][1])
-                x_of_player = relative_display_functions.get_relative_graph_x(
-                    global_game_data.player_objects[global_game_data.current_player_index].absolute_x)
-                y_of_player = relative_display_functions.get_relative_graph_y(
-                    global_game_data.player_objects[global_game_data.current_player_index].absolute_y)
+                x_of_current_objective, y_of_current_objective = objectives[0]
+                x_of_player = transform.x(global_game_data.player_objects[global_game_data.current_player_index].absolute_x)
+                y_of_player = transform.y(global_game_data.player_objects[global_game_data.current_player_index].absolute_y)
                 line_to_next_objective = pyglet.shapes.Line(
                     x_of_current_objective, y_of_current_objective, x_of_player, y_of_player,
                     color=color, width=3, batch=self.batch, group=self.group4)
                 self.path_lines.append(line_to_next_objective)
 
-                if current_objective < (len(current_path) - 1):
-                    # Draw other lines later in path that player will travel to later
-                    for index in range(current_objective + 1, len(current_path)):
-                        x_of_indexed_objective = relative_display_functions.get_relative_graph_x(
-                            graph_data.graph_data[global_game_data.current_graph_index][current_path[index]][0][0])
-                        y_of_indexed_objective = relative_display_functions.get_relative_graph_y(
-                            graph_data.graph_data[global_game_data.current_graph_index][current_path[index]][0][1])
-                        x_of_previous_objective = relative_display_functions.get_relative_graph_x(
-                            graph_data.graph_data[global_game_data.current_graph_index][current_path[index - 1]][0][0])
-                        y_of_previous_objective = relative_display_functions.get_relative_graph_y(
-                            graph_data.graph_data[global_game_data.current_graph_index][current_path[index - 1]][0][1])
-                        line_to_objective = pyglet.shapes.Line(x_of_indexed_objective, y_of_indexed_objective,
-                                                               x_of_previous_objective, y_of_previous_objective,
-                                                               color=color, width=3, batch=self.batch,
-                                                               group=self.group4)
-                        self.path_lines.append(line_to_objective)
-
+                # Draw other lines later in path that player will travel to later
+                for index in range(1, len(objectives)):
+                    x_of_indexed_objective, y_of_indexed_objective = objectives[index]
+                    x_of_previous_objective, y_of_previous_objective = objectives[index - 1]
+                    line_to_objective = pyglet.shapes.Line(x_of_indexed_objective, y_of_indexed_objective,
+                                                           x_of_previous_objective, y_of_previous_objective,
+                                                           color=color, width=3, batch=self.batch,
+                                                           group=self.group4)
+                    self.path_lines.append(line_to_objective)
+
+    # Moves the end of the line to the next objective to where the current player is now
+    def move_player_line(self, transform):
+        if self.path_lines:
+            player = global_game_data.player_objects[global_game_data.current_player_index]
+            self.path_lines[0].x2 = transform.x(player.absolute_x)
+            self.path_lines[0].y2 = transform.y(player.absolute_y)
+
+    # What the path lines are drawn from, apart from the position of the player
+    def path_key(self, transform):
+        player_index = global_game_data.current_player_index
+        if not 0 <= player_index < min(len(config_data.player_data), len(global_game_data.graph_paths)):
+            return transform, player_index
+        return (transform, player_index, global_game_data.player_objects[player_index].current_objective,
+                global_game_data.graph_paths[player_index])
+
+    # Only redraws what changed since the last tick: the graph when the viewport transform changes (another
+    # graph or window size), the path when the player, their objective or their path changes, and otherwise
+    # just the line that follows the player
     def update_graph(self):
-        self.resize_graph()
-        self.draw_new_path_lines()
+        transform = relative_display_functions.get_viewport_transform()
+        if self.render_state.changed("graph", transform):
+            self.resize_graph()
+        if self.render_state.changed("path", self.path_key(transform)):
+            self.draw_new_path_lines()
+        else:
+            self.move_player_line(transform)
 
     def __del__(self):
-        for graph_line in self.graph_lines:
-            graph_line.delete()
+        self.renderer.delete()
 
-        for graph_point in self.graph_points:
-            graph_point.delete()
+        for graph_label in self.graph_labels.values():
+            graph_label.delete()
@@ -0,0 +1,159 @@
+# Bulk drawing of the graph: all edges are one vertex list and all nodes another, instead of a Line per
+# adjacency entry and two Circles per node. With 10k nodes that is two GL objects instead of tens of
+# thousands of shapes, and a window resize is one NumPy transform and one write per list.
+# Only what is inside the display area is written (update_view), so zooming into a large graph draws a
+# bounded part of it.
+#
+# Edges are drawn once per connected pair of nodes (CompiledGraph.undirected_edges), each as a quad of two
+# triangles so they keep the width of the old Lines (core OpenGL does not draw GL_LINES wider than one
+# pixel). Nodes are one GL_POINTS vertex each, the shader draws the outer and inner circle of the old pair
+# of Circles as one point sprite. The vertex data is built by the functions at the top, which only need
+# NumPy; pyglet.graphics and pyglet.gl are only touched once a GraphRenderer is created for a window.
+
+import numpy as np
+import pyglet
+
+import colors
+from spatial_grid import SpatialGrid
+
+node_vertex_source = """#version 150 core
+    in vec2 position;
+    in vec4 colors;
+    in vec4 inner_colors;
+
+    out vec4 outer_color;
+    out vec4 inner_color;
+
+    uniform WindowBlock
+    {
+        mat4 projection;
+        mat4 view;
+    } window;
+
+    uniform float radius;
+
+    void main()
+    {
+        gl_Position = window.projection * window.view * vec4(position, 0.0, 1.0);
+        gl_PointSize = 2.0 * radius;
+        outer_color = colors;
+        inner_color = inner_colors;
+    }
+"""
+
+node_fragment_source = """#version 150 core
+    in vec4 outer_color;
+    in vec4 inner_color;
+    out vec4 final_color;
+
+    uniform float radius;
+    uniform float inner_radius;
+
+    void main()
+    {
+        float distance = length(gl_PointCoord - vec2(0.5)) * 2.0 * radius;
+        if (distance > radius) {
+            discard;
+        }
+        final_color = distance > inner_radius ? outer_color : inner_color;
+    }
+"""
+
+
+# Two triangles per edge covering a band of the given width around the segment from start to end, both
+# (m, 2) arrays of window positions. Returns the (m * 6 * 2) float32 position buffer of a GL_TRIANGLES
+# vertex list
+def edge_quads(start, end, width):
+    direction = end - start
+    length = np.hypot(direction[:, 0], direction[:, 1])[:, None]
+    # Offset from the segment to each side of the band, an edge between nodes at the same spot has none
+    normal = np.divide(np.stack((-direction[:, 1], direction[:, 0]), axis=1) * (width / 2), length,
+                       out=np.zeros_like(direction), where=length > 0)
+    corners = (start + normal, start - normal, end - normal, end + normal)
+    quads = np.stack((corners[0], corners[1], corners[2], corners[0], corners[2], corners[3]), axis=1)
+    return quads.astype(np.float32).ravel()
+
+
+# Which edges have a bounding box (low and high corners, (m, 2) arrays) overlapping bounds
+# (min_x, min_y, max_x, max_y). Edges crossing the rectangle with both ends outside it are kept
+def edges_in_bounds(low, high, bounds):
+    min_x, min_y, max_x, max_y = bounds
+    return (high[:, 0] >= min_x) & (low[:, 0] <= max_x) & (high[:, 1] >= min_y) & (low[:, 1] <= max_y)
+
+
+# One point per node, the (n * 2) float32 position buffer of a GL_POINTS vertex list
+def node_points(points):
+    return points.astype(np.float32).ravel()
+
+
+class GraphRenderer:
+
+    def __init__(self, batch, edge_order=1, node_order=2, edge_width=3, radius=25, inner_radius=20):
+        self.batch = batch
+        self.edge_width = edge_width
+        self.edge_program = pyglet.shapes.get_default_shader()
+        self.edge_group = pyglet.graphics.ShaderGroup(self.edge_program, order=edge_order)
+        self.node_program = pyglet.gl.current_context.create_program((node_vertex_source, 'vertex'),
+                                                                     (node_fragment_source, 'fragment'))
+        self.node_program['radius'] = radius
+        self.node_program['inner_radius'] = inner_radius
+        self.node_group = pyglet.graphics.ShaderGroup(self.node_program, order=node_order)
+        # The node shader sets the point size. Nothing else draws points, so this is left on, and the
+        # corners of each point are discarded by the shader instead of blended away
+        pyglet.gl.glEnable(pyglet.gl.GL_PROGRAM_POINT_SIZE)
+        self.radius = radius
+        self.grid = SpatialGrid(np.empty((0, 2)))
+        self.coordinates = np.empty((0, 2))
+        self.edges = np.empty((0, 2), dtype=np.int64)
+        self.edge_low = self.edge_high = np.empty((0, 2))
+        self.edge_list = None
+        self.node_list = None
+
+    # Replaces the drawn graph. Nothing is drawn until update_view is called
+    def set_graph(self, compiled):
+        self.delete()
+        self.coordinates = compiled.coordinates
+        self.grid = SpatialGrid(compiled.coordinates)
+        self.edges = compiled.undirected_edges()
+        ends = compiled.coordinates[self.edges]
+        self.edge_low = ends.min(axis=1) if len(self.edges) else np.empty((0, 2))
+        self.edge_high = ends.max(axis=1) if len(self.edges) else np.empty((0, 2))
+
+    # Draws only the nodes and edges inside the display area of transform (nodes found with the spatial
+    # grid, edges by their bounding boxes) and returns the visible nodes. Vertex colors are RGBA, the form
+    # colors keeps at TEXT_INDEX
+    def update_view(self, transform):
+        bounds = transform.visible_bounds(margin=self.radius)
+        nodes = self.grid.query(*bounds)
+        edges = self.edges[edges_in_bounds(self.edge_low, self.edge_high, bounds)]
+        quads = edge_quads(transform.apply(self.coordinates[edges[:, 0]]),
+                           transform.apply(self.coordinates[edges[:, 1]]), self.edge_width)
+        self.edge_list = self.write(self.edge_list, self.edge_program, pyglet.gl.GL_TRIANGLES, self.edge_group,
+                                    quads, colors=colors.WHITE[colors.TEXT_INDEX])
+        self.node_list = self.write(self.node_list, self.node_program, pyglet.gl.GL_POINTS, self.node_group,
+                                    node_points(transform.apply(self.coordinates[nodes])),
+                                    colors=colors.YELLOW[colors.TEXT_INDEX],
+                                    inner_colors=colors.WHITE[colors.TEXT_INDEX])
+        return nodes
+
+    # Writes positions to vertex_list in one call, making a new list when the number of vertices changed.
+    # Returns the list, or None when there is nothing to draw
+    def write(self, vertex_list, program, mode, group, positions, **vertex_colors):
+        count = len(positions) // 2
+        if vertex_list is not None and vertex_list.count != count:
+            vertex_list.delete()
+            vertex_list = None
+        if vertex_list is None and count:
+            vertex_list = program.vertex_list(count, mode, self.batch, group,
+                                              **{name: ('Bn', rgba * count) for name, rgba in vertex_colors.items()})
+        if vertex_list is not None:
+            vertex_list.set_attribute_data('position', positions)
+        return vertex_list
+
+    def delete(self):
+        if self.edge_list is not None:
+            self.edge_list.delete()
+            self.edge_list = None
+        if self.node_list is not None:
+            self.node_list.delete()
+            self.node_list = None
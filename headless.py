@@ -0,0 +1,123 @@
+# Headless path evaluation: runs the pathing algorithms over every target node of every graph in a
+# graph file, a directory of graph files or the built in graph_data, and writes one row per run as JSON
+# lines or CSV. Nothing here imports pyglet.
+#
+# A graph file is JSON in the graph_data format, either one graph ([[[x, y], [neighbors]], ...]) or a
+# list of graphs. Run with:
+#   python headless.py graphs/ --algorithms dfs bfs dijkstra --format csv --output results.csv
+#   python headless.py --builtin --seed 1
+
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+import time
+
+from numpy import random
+
+import graph_data
+import pathing
+from compiled_graph import compile_graph
+
+algorithms = list(pathing.path_algorithms)
+
+fields = ["graph", "nodes", "edges", "target", "algorithm", "found", "path_length", "cost", "seconds"]
+
+
+# Yields (name, graph) for every graph in the given files and directories (searched recursively for
+# .json files, in sorted order)
+def load_graphs(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(directory, name) for directory, _, names in os.walk(path)
+                           for name in names if name.endswith(".json"))
+        else:
+            files = [path]
+        for file_path in files:
+            with open(file_path) as graph_file:
+                data = json.load(graph_file)
+            # One graph starts with a node ([x, y], [neighbors]), a list of graphs with a graph
+            if data and isinstance(data[0][0][0], (int, float)):
+                yield file_path, to_graph(data)
+            else:
+                for index, graph in enumerate(data):
+                    yield f"{file_path}#{index}", to_graph(graph)
+
+
+def builtin_graphs():
+    for index, graph in enumerate(graph_data.graph_data):
+        yield f"graph_data[{index}]", graph
+
+
+# JSON has no tuples, the graph_data format keeps coordinates as (x, y)
+def to_graph(data):
+    return [[tuple(graph_point[0]), list(graph_point[1])] for graph_point in data]
+
+
+# Total Euclidean length of a path from the start node (path does not include it, like the path functions)
+def path_cost(graph, path):
+    route = [0] + path
+    return sum(pathing.calculate_distance(graph[route[i]][0], graph[route[i + 1]][0])
+               for i in range(len(route) - 1))
+
+
+# One row per (target, algorithm) for a graph, every inner node is used as the target in turn.
+# pathing.find_path takes the target as an argument, so the game state in global_game_data is never
+# touched, and the random player draws from its own generator (seeded for every run when seed is given)
+def evaluate_graph(name, graph, algorithm_names, seed=None):
+    compiled = compile_graph(graph)
+    for target_node in range(1, len(graph) - 1):
+        for algorithm in algorithm_names:
+            options = {"rng": random.default_rng(seed)} if algorithm == "random" else {}
+            # Messages the path functions print go to standard error so they cannot mix with the rows
+            with contextlib.redirect_stdout(sys.stderr):
+                started = time.perf_counter()
+                path = pathing.find_path(compiled, 0, target_node, len(compiled) - 1, algorithm, **options)
+                elapsed = time.perf_counter() - started
+            yield {"graph": name, "nodes": len(compiled), "edges": compiled.edge_count(), "target": target_node,
+                   "algorithm": algorithm, "found": bool(path), "path_length": len(path),
+                   "cost": path_cost(compiled, path) if path else None, "seconds": elapsed}
+
+
+# Rows are written as they are produced, so memory does not grow with the number of graphs
+def write_rows(rows, output, output_format):
+    if output_format == "csv":
+        writer = csv.DictWriter(output, fieldnames=fields)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+    else:
+        for row in rows:
+            output.write(json.dumps(row) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate the pathing algorithms without a window")
+    parser.add_argument("paths", nargs="*", help="graph files or directories of .json graph files")
+    parser.add_argument("--builtin", action="store_true", help="also evaluate the graphs in graph_data")
+    parser.add_argument("--algorithms", nargs="+", default=algorithms, choices=algorithms)
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    parser.add_argument("--output", help="output file (standard output by default)")
+    parser.add_argument("--seed", type=int, help="seed for the random player, the same for every run")
+    arguments = parser.parse_args(argv)
+    if not arguments.paths and not arguments.builtin:
+        parser.error("give graph files or directories, or --builtin")
+
+    def rows():
+        if arguments.builtin:
+            for name, graph in builtin_graphs():
+                yield from evaluate_graph(name, graph, arguments.algorithms, arguments.seed)
+        for name, graph in load_graphs(arguments.paths):
+            yield from evaluate_graph(name, graph, arguments.algorithms, arguments.seed)
+
+    if arguments.output:
+        with open(arguments.output, "w", newline="") as output:
+            write_rows(rows(), output, arguments.format)
+    else:
+        write_rows(rows(), sys.stdout, arguments.format)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,14 @@ import pyglet
 import config_data
 import global_game_data
 import pathing
+import relative_display_functions
 from graph_data import graph_data
 from scoreboard import Scoreboard
 from graph import Graph
 from player_object import Player
+from simulation import Simulation
+from compiled_graph import compile_graph
+from render_state import FrameTimer
 import random
 
 # Create Viewing Window
@@ -33,8 +37,18 @@ for graph in graph_data:
 # Define Game Objects
 scoreboard = Scoreboard(main_batch, text_display_area)
 graph = Graph(main_batch)
+# Moves every player, at its own fixed timestep (config_data.simulation_timestep)
+simulation = Simulation(relative_display_functions.get_absolute_speed(), config_data.simulation_timestep)
+
+
+def load_simulation():
+    simulation.load(compile_graph(graph_data[global_game_data.current_graph_index]).coordinates,
+                    global_game_data.graph_paths)
+
+
+load_simulation()
 for player_index, player in enumerate(config_data.player_data):
-    global_game_data.player_objects.append(Player(player, player_index, main_batch, player_layer))
+    global_game_data.player_objects.append(Player(player, player_index, main_batch, player_layer, simulation))
 
 new_graph_button = pyglet.gui.widgets.PushButton(160, 20,
                                                  pressed=pyglet.resource.image('new_graph_pressed.png'),
@@ -48,11 +62,22 @@ quit_button = pyglet.gui.widgets.PushButton(20, 20,
                                             group=button_display_area)
 
 
+# Time taken by each update, reported every few seconds when config_data.report_frame_times is set
+frame_timer = FrameTimer()
+
+
 def update(change_in_time):
-    scoreboard.update_scoreboard()
-    graph.update_graph()
-    for player_object in global_game_data.player_objects:
-        player_object.update(change_in_time)
+    with frame_timer.measure():
+        scoreboard.update_scoreboard()
+        graph.update_graph()
+        simulation.advance(change_in_time)
+        global_game_data.current_player_index = simulation.current
+        for player_object in global_game_data.player_objects:
+            player_object.update()
+
+
+def report_frame_times(change_in_time):
+    print("Update:", frame_timer.report())
 
 
 @window.event
@@ -71,6 +96,23 @@ def on_mouse_press(x, y, button, modifiers):
         window.close()
 
 
+# Scrolling zooms the graph around the mouse pointer, dragging pans it and Home resets the view
+@window.event
+def on_mouse_scroll(x, y, scroll_x, scroll_y):
+    relative_display_functions.zoom_view(1.2 ** scroll_y, x, y)
+
+
+@window.event
+def on_mouse_drag(x, y, dx, dy, buttons, modifiers):
+    relative_display_functions.pan_view(dx, dy)
+
+
+@window.event
+def on_key_press(symbol, modifiers):
+    if symbol == pyglet.window.key.HOME:
+        relative_display_functions.reset_view()
+
+
 @window.event
 def on_mouse_release(x, y, button, modifiers):
     new_graph_button.value = False
@@ -86,13 +128,16 @@ def change_graph():
     global_game_data.current_graph_index += 1
     if global_game_data.current_graph_index >= len(graph_data):
         global_game_data.current_graph_index = 0
-    for player_object in global_game_data.player_objects:
-        player_object.reset_player()
     global_game_data.current_player_index = 0
+    relative_display_functions.reset_view()
     graph.set_up_graph()
     pathing.set_current_graph_paths()
+    # Puts every player back at the start of the new graph
+    load_simulation()
 
 
 if __name__ == '__main__':
     pyglet.clock.schedule_interval(update, 1 / 120.0)
+    if config_data.report_frame_times:
+        pyglet.clock.schedule_interval(report_frame_times, 5)
     pyglet.app.run()
@@ -0,0 +1,142 @@
+# Process pool engine for the work that splits cleanly across sources: all-pairs shortest paths as one
+# Dijkstra tree per source, large batches of start -> target -> exit route queries, and the SJT
+# permutation check for Hamiltonian cycles split into ranges of permutation numbers.
+#
+# The compiled graph (CSR buffers, coordinates and edge weights) is copied into shared memory once and
+# every worker attaches to it in its initializer and works on views of the shared blocks (nothing is
+# copied per worker), so tasks only carry source numbers or route triples. The pool is started by the
+# with block or by the first call that needs it.
+# Results are streamed back in input order no matter which worker finishes first.
+#
+#   with ParallelEngine(graph_data.graph_data[2], workers=8) as engine:
+#       for dist_row, parent_row in engine.apsp_rows():
+#           ...
+#       paths = list(engine.dijkstra_paths(routes))
+#       cycles = list(engine.sjt_ham_cycles())
+
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import f_w
+import pathing
+import permutation
+from compiled_graph import CompiledGraph, compile_graph
+
+# Graph rebuilt from shared memory in each worker process. Its arrays are views of the shared blocks, so
+# the blocks stay attached for as long as the worker runs
+_worker_graph = None
+_worker_adjacency = None
+_worker_blocks = []
+
+
+def _attach_graph(layout):
+    global _worker_graph, _worker_adjacency
+    arrays = {}
+    for name, (block_name, dtype, length) in layout.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _worker_blocks.append(block)
+        arrays[name] = np.ndarray((length,), dtype=dtype, buffer=block.buf)
+    _worker_graph = CompiledGraph.from_csr(arrays["offsets"], arrays["indices"], arrays["coordinates"],
+                                           weights=arrays["weights"], copy=False)
+    _worker_adjacency = None
+
+
+def _apsp_chunk(sources):
+    global _worker_adjacency
+    if _worker_adjacency is None:
+        _worker_adjacency = f_w.weighted_adjacency(_worker_graph)
+    return [f_w.dijkstra_row(_worker_adjacency, source) for source in sources]
+
+
+def _routes_chunk(routes):
+    return pathing.get_dijkstra_paths(_worker_graph, routes)
+
+
+def _sjt_shard(shard):
+    start, count = shard
+    return list(permutation.sjt_ham_cycles(_worker_graph, start, count))
+
+
+class ParallelEngine:
+
+    def __init__(self, graph, workers=None, chunk_size=None):
+        self.graph = compile_graph(graph)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.blocks = []
+        self.executor = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # Copies the graph into shared memory and starts the pool. Runs on entering the with block or on the
+    # first call that needs the pool; without a with block, call close() when done
+    def start(self):
+        if self.executor is not None:
+            return self
+        layout = {}
+        buffers = {"offsets": self.graph.offsets_np, "indices": self.graph.indices_np,
+                   "coordinates": self.graph.coordinates.ravel(), "weights": self.graph.weights_np}
+        for name, values in buffers.items():
+            block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+            self.blocks.append(block)
+            layout[name] = (block.name, values.dtype.str, len(values))
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_attach_graph,
+                                            initargs=(layout,))
+        return self
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks.clear()
+
+    # executor.map over the pool, starting it first if needed
+    def map(self, function, items):
+        return self.start().executor.map(function, items)
+
+    # Splits items into chunks, a few per worker so faster workers pick up the slack
+    def chunks(self, items):
+        chunk_size = self.chunk_size or max(1, len(items) // (self.workers * 4))
+        return [items[index:index + chunk_size] for index in range(0, len(items), chunk_size)]
+
+    # Yields (dist_row, parent_row) for sources 0 .. n-1 in order, in the f_w list format (None parents).
+    # Edge weights are lengths, so no Johnson reweighting is needed
+    def apsp_rows(self):
+        for rows in self.map(_apsp_chunk, self.chunks(list(range(len(self.graph))))):
+            yield from rows
+
+    def apsp(self):
+        dist = []
+        parent = []
+        for dist_row, parent_row in self.apsp_rows():
+            dist.append(dist_row)
+            parent.append(parent_row)
+        return dist, parent
+
+    # Yields a Dijkstra route for every (start, target, exit) triple, in order and in the format of
+    # pathing.get_dijkstra_paths (each chunk shares its search trees)
+    def dijkstra_paths(self, routes):
+        for paths in self.map(_routes_chunk, self.chunks(list(routes))):
+            yield from paths
+
+    # Yields the same cycles as permutation.sjt_ham_cycles, in the same SJT order. Each worker unranks the
+    # first permutation of its shard and walks the transpositions from there, so the shards are independent
+    def sjt_ham_cycles(self, shards=None):
+        total = math.factorial(max(len(self.graph) - 2, 0))
+        shards = shards or self.workers * 4
+        shard_size = max(1, -(-total // shards))
+        ranges = [(start, min(shard_size, total - start)) for start in range(0, total, shard_size)]
+        for cycles in self.map(_sjt_shard, ranges):
+            yield from cycles
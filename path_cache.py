@@ -0,0 +1,70 @@
+# Bounded LRU cache for computed paths, used by pathing.cached_find_path
+#
+# Entries are evicted least recently used first once there are more than max_entries of them or their
+# estimated size passes max_bytes. Keys start with the content hash of the graph (see
+# CompiledGraph.fingerprint), so an edited graph simply stops matching its old entries, which then age out.
+# hits, misses and evictions count what happened since the cache was created or cleared
+
+import sys
+import threading
+from collections import OrderedDict
+
+
+class PathCache:
+
+    def __init__(self, max_entries=4096, max_bytes=16 * 2 ** 20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    # The stored value, or None (counted as a miss) when key is not cached
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    # value is (path tuple, stats dict), its size is estimated from the path length
+    def put(self, key, value):
+        size = entry_bytes(key, value)
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.bytes += size
+            while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+                self.bytes -= self.entries.popitem(last=False)[1][1]
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.bytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+
+# Approximate memory held by one entry: the key tuple and its hash string, the path tuple with one int
+# object per node and the stats dict
+def entry_bytes(key, value):
+    path, stats = value
+    return sys.getsizeof(key) + sys.getsizeof(key[0]) + sys.getsizeof(path) + 28 * len(path) + \
+        sys.getsizeof(stats)
@@ -0,0 +1,245 @@
+# Asyncio path query service: many game clients ask for routes over one TCP connection each, one JSON
+# request per line, and get one JSON response per line (matched by "id", responses can come back in any
+# order). Requests:
+#   {"id": 1, "graph": "graph_data[2]", "op": "path", "start": 0, "target": 5, "exit": 23, "algorithm": "dijkstra"}
+#   {"id": 2, "graph": "graph_data[2]", "op": "distance", "start": 0, "end": 23}
+#   {"id": 3, "op": "metrics"}
+# "path" runs pathing.find_path ("algorithm" defaults to dijkstra) and answers {"id", "path"}. "distance"
+# answers {"id", "distance", "path"} from the all-pairs shortest path row of the start node (f_w).
+#
+# Requests wait in a bounded queue: when it is full, reading from the client connection pauses until
+# there is room again, so a flood of requests slows its senders down instead of growing memory.
+# The dispatcher takes whatever is queued (up to max_batch, waiting at most batch_window seconds for
+# more), groups it by graph and runs each group as one batch in the executor: every Dijkstra route in
+# the group shares its search trees (pathing.get_dijkstra_paths) and every distance query from the same
+# start shares one all-pairs row. Run with:
+#   python path_service.py --builtin --port 8765
+
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import f_w
+import headless
+import pathing
+from compiled_graph import compile_graph
+
+
+def is_node(graph, value):
+    return type(value) is int and 0 <= value < len(graph)
+
+
+# Answers for one batch of requests on the same graph, in request order. Runs in the executor
+def run_batch(graph, requests):
+    answers = [None] * len(requests)
+    routes = []
+    distance_rows = {}
+    adjacency = None
+    for index, request in enumerate(requests):
+        try:
+            op = request.get("op", "path")
+            # A bad node gets its own error here instead of failing the batched solve for the whole group
+            node_fields = {"path": ("start", "target", "exit"), "distance": ("start", "end")}.get(op, ())
+            bad = [field for field in node_fields if not is_node(graph, request.get(field))]
+            if bad:
+                answers[index] = {"error": f"Bad request: {', '.join(bad)} must be node indices in "
+                                           f"range({len(graph)})"}
+            elif op == "path" and request.get("algorithm", "dijkstra") == "dijkstra" and "mode" not in request:
+                routes.append((index, (request["start"], request["target"], request["exit"])))
+            elif op == "path":
+                options = {"mode": request["mode"]} if "mode" in request else {}
+                path = pathing.find_path(graph, request["start"], request["target"], request["exit"],
+                                         request.get("algorithm", "dijkstra"), **options)
+                answers[index] = {"path": path}
+            elif op == "distance":
+                if adjacency is None:
+                    adjacency = f_w.weighted_adjacency(graph)
+                start, end = request["start"], request["end"]
+                if start not in distance_rows:
+                    distance_rows[start] = f_w.dijkstra_row(adjacency, start)
+                dist_row, parent_row = distance_rows[start]
+                path = f_w.reconstruct_path({start: parent_row}, start, end) if start != end else [start]
+                answers[index] = {"distance": dist_row[end] if path else None, "path": path}
+            else:
+                answers[index] = {"error": f"Unknown op: {op}"}
+        except (KeyError, IndexError, TypeError, ValueError) as error:
+            answers[index] = {"error": f"Bad request: {error!r}"}
+    if routes:
+        paths = pathing.get_dijkstra_paths(graph, [route for _, route in routes])
+        for (index, _), path in zip(routes, paths):
+            answers[index] = {"path": path}
+    return answers
+
+
+class PathService:
+
+    def __init__(self, graphs, queue_size=1024, max_batch=64, batch_window=0.002, executor=None,
+                 max_inflight=4, latency_window=100_000):
+        self.graphs = {name: compile_graph(graph) for name, graph in graphs.items()}
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_inflight)
+        self.inflight = asyncio.Semaphore(max_inflight)
+        # Latency of the most recent requests in seconds, from arrival to answer
+        self.latencies = deque(maxlen=latency_window)
+        self.requests = 0
+        self.batches = 0
+        self.dispatcher = None
+        self.running = set()
+        self.server = None
+
+    async def start(self):
+        self.dispatcher = asyncio.create_task(self.dispatch())
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+            try:
+                await self.dispatcher
+            except asyncio.CancelledError:
+                pass
+        self.executor.shutdown(wait=False)
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        await self.start()
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server
+
+    # Queues one request (a dict) and returns a future for its response. Waits while the queue is full
+    async def enqueue(self, request):
+        arrived = time.perf_counter()
+        answer = asyncio.get_running_loop().create_future()
+        if request.get("op") == "metrics":
+            answer.set_result({"metrics": self.metrics()})
+        elif not isinstance(request.get("graph"), str):
+            # A list or dict cannot be looked up at all, it gets its own error like a bad node index
+            answer.set_result({"error": "Bad request: graph must be the name of a served graph"})
+        elif request["graph"] not in self.graphs:
+            answer.set_result({"error": f"Unknown graph: {request.get('graph')}"})
+        else:
+            await self.queue.put((request, answer, arrived))
+        return answer
+
+    # Answers one request from inside the process
+    async def submit(self, request):
+        response = await (await self.enqueue(request))
+        return {"id": request.get("id"), **response}
+
+    async def dispatch(self):
+        while True:
+            pending = [await self.queue.get()]
+            # Give requests arriving right behind the first one a moment to join its batch
+            if self.batch_window and self.queue.qsize() < self.max_batch - 1:
+                await asyncio.sleep(self.batch_window)
+            while len(pending) < self.max_batch and not self.queue.empty():
+                pending.append(self.queue.get_nowait())
+            groups = {}
+            for entry in pending:
+                groups.setdefault(entry[0]["graph"], []).append(entry)
+            for name, group in groups.items():
+                await self.inflight.acquire()
+                task = asyncio.create_task(self.run_group(name, group))
+                self.running.add(task)
+                task.add_done_callback(self.running.discard)
+
+    async def run_group(self, name, group):
+        try:
+            requests = [request for request, _, _ in group]
+            responses = await asyncio.get_running_loop().run_in_executor(self.executor, run_batch,
+                                                                         self.graphs[name], requests)
+        except Exception as error:
+            responses = [{"error": f"Batch failed: {error!r}"}] * len(group)
+        finally:
+            self.inflight.release()
+        self.batches += 1
+        finished = time.perf_counter()
+        for (_, answer, arrived), response in zip(group, responses):
+            self.requests += 1
+            self.latencies.append(finished - arrived)
+            if not answer.done():
+                answer.set_result(response)
+
+    async def handle_connection(self, reader, writer):
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(request_id, answer):
+            response = {"id": request_id, **await answer}
+            async with write_lock:
+                writer.write((json.dumps(response) + "\n").encode())
+                await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    request = {}
+                if not isinstance(request, dict):
+                    request = {}
+                # The request is queued before the next line is read, so a full queue stops this client
+                answer = await self.enqueue(request) if request else self.rejected()
+                task = asyncio.create_task(respond(request.get("id"), answer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+
+    @staticmethod
+    def rejected():
+        answer = asyncio.get_running_loop().create_future()
+        answer.set_result({"error": "Requests must be one JSON object per line"})
+        return answer
+
+    # Request count, batch count and latency percentiles in milliseconds over the recent requests
+    def metrics(self):
+        latencies = np.array(self.latencies) * 1000
+        percentiles = np.percentile(latencies, [50, 90, 99]).tolist() if len(latencies) else [None] * 3
+        return {"requests": self.requests, "batches": self.batches, "queued": self.queue.qsize(),
+                "mean_batch": self.requests / self.batches if self.batches else None,
+                "p50_ms": percentiles[0], "p90_ms": percentiles[1], "p99_ms": percentiles[2]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve path queries over TCP, one JSON request per line")
+    parser.add_argument("paths", nargs="*", help="graph files or directories of .json graph files")
+    parser.add_argument("--builtin", action="store_true", help="serve the graphs in graph_data")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--queue-size", type=int, default=1024)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=4)
+    arguments = parser.parse_args(argv)
+    graphs = dict(headless.builtin_graphs()) if arguments.builtin else {}
+    graphs.update(headless.load_graphs(arguments.paths))
+    if not graphs:
+        parser.error("give graph files or directories, or --builtin")
+
+    async def run():
+        service = PathService(graphs, queue_size=arguments.queue_size, max_batch=arguments.max_batch,
+                              max_inflight=arguments.workers)
+        server = await service.serve(arguments.host, arguments.port)
+        print(f"Serving {len(graphs)} graphs on {arguments.host}:{arguments.port}")
+        try:
+            await server.serve_forever()
+        finally:
+            await service.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
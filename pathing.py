@@ -1,29 +1,106 @@
 import graph_data
 import global_game_data
+from compiled_graph import compile_graph
+from path_cache import PathCache
+import numpy as np
 from numpy import random
-from collections import deque
 import heapq
+import math
 
+# Called every time the game changes graphs. The searches go through cached_find_path, so going back to a
+# graph that has not changed (same content and target) reuses its paths instead of searching again.
+# The random player has no seed and is drawn fresh every time
 def set_current_graph_paths():
+    graph = resolve_graph(None)
+    target_node = current_target_node()
+    exit_node = len(graph) - 1
     global_game_data.graph_paths.clear()
     global_game_data.graph_paths.append(get_test_path())
     global_game_data.graph_paths.append(get_random_path())
-    global_game_data.graph_paths.append(get_dfs_path())
-    global_game_data.graph_paths.append(get_bfs_path())
-    global_game_data.graph_paths.append(get_dijkstra_path())
+    global_game_data.graph_paths.append(cached_find_path(graph, 0, target_node, exit_node, "dfs"))
+    global_game_data.graph_paths.append(cached_find_path(graph, 0, target_node, exit_node, "bfs"))
+    dijkstra_stats = {}
+    astar_stats = {}
+    global_game_data.graph_paths.append(cached_find_path(graph, 0, target_node, exit_node, "dijkstra",
+                                                         stats=dijkstra_stats))
+    global_game_data.graph_paths.append(cached_find_path(graph, 0, target_node, exit_node, "astar",
+                                                         stats=astar_stats))
+    # Nodes each weighted search expanded on this graph, to compare A* against Dijkstra
+    global_game_data.nodes_expanded = {"Dijkstra": dijkstra_stats.get("expanded", 0),
+                                       "A*": astar_stats.get("expanded", 0)}
+
+
+# Graph the path functions run on: the one passed in (nested lists or a CompiledGraph) or the current graph
+def resolve_graph(graph):
+    if graph is None:
+        return graph_data.graph_data[global_game_data.current_graph_index]
+    return graph
 
 
 def get_test_path():
     return graph_data.test_path[global_game_data.current_graph_index]
 
+# Path from start_node through target_node to exit_node with the chosen algorithm (a name from
+# path_algorithms), in the same format as the get_*_path functions: a list of nodes after start_node,
+# or [] if there is no such path. Everything the search needs is passed in, nothing is read from
+# global_game_data, so any number of queries can run at once from threads or an async server.
+# options go to the algorithm: mode and stats for bfs and dijkstra, heuristic and stats for astar,
+# max_retries and rng (a NumPy Generator, the global NumPy generator by default) for random
+def find_path(graph, start_node, target_node, exit_node, algorithm="dijkstra", **options):
+    # Compiled (and checked against the nested lists) once here, the algorithm reuses it
+    graph = compile_graph(graph)
+    return path_algorithms[algorithm](graph, start_node, target_node, exit_node, **options)
+
+
+# Computed paths, keyed by (graph content hash, start, target, exit, algorithm, seed, options)
+path_cache = PathCache()
+
+
+# find_path through path_cache. Nested list graphs are checked against their compiled form on every call
+# (O(nodes + edges), see compile_graph), so editing graph_data in place can never return a stale path.
+# The random player is only cached when a seed is given (it then draws from default_rng(seed)); calls
+# with an rng of their own or with options that cannot be hashed are not cached. If stats is a dict,
+# the "expanded" count of the original search is added to it on a hit as well
+def cached_find_path(graph, start_node, target_node, exit_node, algorithm="dijkstra", seed=None, stats=None,
+                     **options):
+    compiled = compile_graph(graph)
+    key = (compiled.fingerprint(), start_node, target_node, exit_node, algorithm, seed,
+           tuple(sorted(options.items())))
+    try:
+        hash(key)
+    except TypeError:
+        key = None
+    if "rng" in options or (algorithm == "random" and seed is None) or key is None:
+        if stats is not None:
+            options["stats"] = stats
+        return find_path(compiled, start_node, target_node, exit_node, algorithm, **options)
+
+    cached = path_cache.get(key)
+    if cached is None:
+        search_stats = {}
+        if algorithm in algorithms_with_stats:
+            options["stats"] = search_stats
+        if algorithm == "random":
+            options["rng"] = random.default_rng(seed)
+        path = find_path(compiled, start_node, target_node, exit_node, algorithm, **options)
+        cached = (tuple(path), search_stats)
+        path_cache.put(key, cached)
+    if stats is not None:
+        stats["expanded"] = stats.get("expanded", 0) + cached[1].get("expanded", 0)
+    return list(cached[0])
+
+
+# Target node of the current graph in the game
+def current_target_node():
+    return global_game_data.target_node[global_game_data.current_graph_index]
+
+
 # Tries 20 or variable amount of times to generate a successful random path
-def get_random_path(max_retries = 20):
-    # Get data
-    graph = graph_data.graph_data[global_game_data.current_graph_index]
-    start_node = 0
-    exit_node = len(graph) - 1
-    target_node = global_game_data.target_node[global_game_data.current_graph_index]
-    
+def get_random_path(max_retries = 20, graph=None):
+    graph = resolve_graph(graph)
+    return find_path(graph, 0, current_target_node(), len(graph) - 1, "random", max_retries=max_retries)
+
+def random_route(graph, start_node, target_node, exit_node, max_retries=20, rng=random):
     # Precondition: Must have at least 2 nodes
     assert len(graph) > 1, "Graph must have at least 2 nodes"
     
@@ -34,7 +111,7 @@ def get_random_path(max_retries = 20):
             neighbors = [n for n in graph[current_node][1] if n not in visited]
             if not neighbors:
                 return None
-            next_node = random.choice(neighbors)
+            next_node = rng.choice(neighbors)
             path.append(int(next_node))
             visited.add(int(next_node))
             current_node = next_node
@@ -63,28 +140,14 @@ def get_random_path(max_retries = 20):
     return []
 
 # Creates and returns a DFS path from the start to the end while hitting the target along the way
-def get_dfs_path():
-    graph = graph_data.graph_data[global_game_data.current_graph_index]
-    start_node = 0
-    exit_node = len(graph) - 1
-    target_node = global_game_data.target_node[global_game_data.current_graph_index]
-    
+def get_dfs_path(graph=None):
+    graph = resolve_graph(graph)
+    return find_path(graph, 0, current_target_node(), len(graph) - 1, "dfs")
+
+def dfs_route(graph, start_node, target_node, exit_node):
     # Helper function gives a DFS search from a starting node to a target node
     def dfs_search(start, target):
-        stack = [(start, [start])]
-        visited = set()
-        
-        while stack:
-            (current_node, path) = stack.pop()
-            if current_node in visited:
-                continue
-            visited.add(current_node)
-            if current_node == target:
-                return path
-            for neighbor in graph[current_node][1]:
-                if neighbor not in visited:
-                    stack.append((neighbor, path + [neighbor]))
-        return []
+        return search(graph, start, target, "dfs")
     
     # Gets DFS path from start to target and then target to exit
     start_to_target_path = dfs_search(start_node, target_node)
@@ -98,36 +161,24 @@ def get_dfs_path():
         # Postconditions a, b, c
         assert target_node in full_path, "Path must include the target node"
         assert full_path[-1] == exit_node, "Path must end at the exit node"
+        edges = compile_graph(graph, verify=False)
         for i in range(len(full_path) - 1):
-            assert full_path[i+1] in graph[full_path[i]][1], f"Vertices {full_path[i]} and {full_path[i+1]} must be connected"
+            assert edges.lists_edge(full_path[i], full_path[i+1]), f"Vertices {full_path[i]} and {full_path[i+1]} must be connected"
         
         return full_path
     else:
         return []
 
-# Creates and returns a BFS path from the start to the end while hitting the target along the way
-def get_bfs_path():
-    graph = graph_data.graph_data[global_game_data.current_graph_index]
-    start_node = 0
-    exit_node = len(graph) - 1
-    target_node = global_game_data.target_node[global_game_data.current_graph_index]
-    
+# Creates and returns a BFS path from the start to the end while hitting the target along the way.
+# mode="bidirectional" searches each leg from both of its ends, the path has the same number of steps
+def get_bfs_path(graph=None, mode="forward", stats=None):
+    graph = resolve_graph(graph)
+    return find_path(graph, 0, current_target_node(), len(graph) - 1, "bfs", mode=mode, stats=stats)
+
+def bfs_route(graph, start_node, target_node, exit_node, mode="forward", stats=None):
     # Helper function gives a BFS search from a starting node to a target node
     def bfs_search(start, target):
-        queue = deque([(start, [start])])
-        visited = set()
-        
-        while queue:
-            current_node, path = queue.popleft()
-            if current_node in visited:
-                continue
-            visited.add(current_node)
-            if current_node == target:
-                return path
-            for neighbor in graph[current_node][1]:
-                if neighbor not in visited:
-                    queue.append((neighbor, path + [neighbor]))
-        return []
+        return search(graph, start, target, search_strategies["bfs"][mode], stats=stats)
     
     # Gets BFS path from start to target and then target to exit
     start_to_target_path = bfs_search(start_node, target_node)
@@ -141,47 +192,29 @@ def get_bfs_path():
         # Postconditions a, b, c
         assert target_node in full_path, "Path must include the target node"
         assert full_path[-1] == exit_node, "Path must end at the exit node"
+        edges = compile_graph(graph, verify=False)
         for i in range(len(full_path) - 1):
-            assert full_path[i+1] in graph[full_path[i]][1], f"Vertices {full_path[i]} and {full_path[i+1]} must be connected"
+            assert edges.lists_edge(full_path[i], full_path[i+1]), f"Vertices {full_path[i]} and {full_path[i+1]} must be connected"
         
         return full_path
     else:
         return []
 
 
-def get_dijkstra_path():
-    graph = graph_data.graph_data[global_game_data.current_graph_index]
-    start_node = 0
-    target_node = global_game_data.target_node[global_game_data.current_graph_index]
-    exit_node = len(graph) - 1
+# Pass a dict as stats to get the number of nodes expanded over both legs in stats["expanded"].
+# mode="bidirectional" searches each leg from both of its ends and mode="single_pass" grows one search
+# tree from the target that serves both legs (see get_dijkstra_paths), the route has the same length
+def get_dijkstra_path(graph=None, stats=None, mode="forward"):
+    graph = resolve_graph(graph)
+    return find_path(graph, 0, current_target_node(), len(graph) - 1, "dijkstra", stats=stats, mode=mode)
+
+def dijkstra_route(graph, start_node, target_node, exit_node, stats=None, mode="forward"):
+    if mode == "single_pass":
+        return get_dijkstra_paths(graph, [(start_node, target_node, exit_node)], stats, single_pass=True)[0]
     
     # Helper function to perform dijkstra from a given start to a given end
     def dijkstra(graph, start, end):
-        # Priority Queue
-        pq = []
-        heapq.heappush(pq, (0, start, [start]))
-        visited = set()
-        
-        while pq:
-            dist, current_node, path = heapq.heappop(pq)
-            
-            # Skip the node if it's already been visited
-            if current_node in visited:
-                continue
-            visited.add(current_node)
-            
-            # If we reach the last node, return the path
-            if current_node == end:
-                return path
-            
-            # Explore neighbors
-            for neighbor in graph[current_node][1]:
-                if neighbor not in visited:
-                    edge_weight = calculate_distance(graph[current_node][0], graph[neighbor][0])
-                    heapq.heappush(pq, (dist + edge_weight, neighbor, path + [neighbor]))
-        
-        # Return empty list if no path is found to not break functionality
-        return []
+        return search(graph, start, end, search_strategies["dijkstra"][mode], stats=stats)
     
     # Get path from start to target
     start_to_target = dijkstra(graph, start_node, target_node)
@@ -199,12 +232,365 @@ def get_dijkstra_path():
     # Postconditions
     assert full_path[0] == start_node, "Path must start at the Start node."
     assert full_path[-1] == exit_node, "Path must end at the Exit node."
+    edges = compile_graph(graph, verify=False)
     for i in range(len(full_path) - 1):
-        assert full_path[i + 1] in graph[full_path[i]][1], f"Edge {full_path[i]} -> {full_path[i + 1]} must exist."
+        assert edges.lists_edge(full_path[i], full_path[i + 1]), f"Edge {full_path[i]} -> {full_path[i + 1]} must exist."
     
     full_path = full_path[1:]
     return full_path
 
-# Helper function for Euclidean distance found on Stack Overflow
+# Creates and returns an A* path from the start to the exit through the target. It returns a route as
+# short as Dijkstra's but uses a heuristic (Euclidean distance to the goal by default) to expand fewer nodes.
+# heuristic is a name from heuristics or a function (graph, goal) -> estimate for every node, which must
+# never overestimate the remaining distance (nodes are expanded again when an estimate that is not
+# consistent made them too early). Pass a dict as stats to get stats["expanded"]
+def get_astar_path(graph=None, heuristic="euclidean", stats=None):
+    graph = resolve_graph(graph)
+    return find_path(graph, 0, current_target_node(), len(graph) - 1, "astar", heuristic=heuristic, stats=stats)
+
+def astar_route(graph, start_node, target_node, exit_node, heuristic="euclidean", stats=None):
+    # Get path from start to target and from target to exit
+    start_to_target = search(graph, start_node, target_node, "astar", heuristic=heuristic, stats=stats)
+    if not start_to_target:
+        return []
+    target_to_exit = search(graph, target_node, exit_node, "astar", heuristic=heuristic, stats=stats)
+    if not target_to_exit:
+        return []
+
+    # Append the two paths and get rid of the overlap
+    full_path = start_to_target[:-1] + target_to_exit
+
+    # Postconditions
+    assert full_path[0] == start_node, "Path must start at the Start node."
+    assert target_node in full_path, "Path must include the target node."
+    assert full_path[-1] == exit_node, "Path must end at the Exit node."
+    edges = compile_graph(graph, verify=False)
+    for i in range(len(full_path) - 1):
+        assert edges.lists_edge(full_path[i], full_path[i + 1]), f"Edge {full_path[i]} -> {full_path[i + 1]} must exist."
+
+    full_path = full_path[1:]
+    return full_path
+
+path_algorithms = {
+    "random": random_route,
+    "dfs": dfs_route,
+    "bfs": bfs_route,
+    "dijkstra": dijkstra_route,
+    "astar": astar_route,
+}
+
+# Algorithms that count expanded nodes when given a stats dict
+algorithms_with_stats = {"bfs", "dijkstra", "astar"}
+
+# Search core strategy used by each path function in each mode
+search_strategies = {
+    "bfs": {"forward": "bfs", "bidirectional": "bidirectional_bfs"},
+    "dijkstra": {"forward": "dijkstra", "bidirectional": "bidirectional_dijkstra"},
+}
+
+# Admissible A* heuristics: each returns a lower bound on the distance from every node to the goal
+def euclidean_heuristic(graph, goal):
+    differences = graph.coordinates - graph.coordinates[goal]
+    return np.sqrt(differences[:, 0] * differences[:, 0] + differences[:, 1] * differences[:, 1]).tolist()
+
+# No sense of direction at all, A* then expands exactly like Dijkstra
+def zero_heuristic(graph, goal):
+    return [0] * len(graph)
+
+heuristics = {
+    "euclidean": euclidean_heuristic,
+    "zero": zero_heuristic,
+}
+
+# Shared search core for DFS, BFS and Dijkstra. Instead of pushing a copy of the whole path with
+# every neighbor, each frontier entry only remembers the node that pushed it. The predecessor of a
+# node is recorded once, the first time it is settled, so the path is rebuilt a single time at the goal
+# and the order nodes are settled in (and therefore the returned path) matches the path-copying version.
+# The search runs on the compiled CSR form of the graph (see compiled_graph.py). A* uses the same core
+# with a heuristic, and if stats is a dict the number of expanded nodes is added to stats["expanded"]
+def search(graph, start, goal, strategy, heuristic=None, stats=None):
+    graph = compile_graph(graph)
+    n = len(graph)
+    offsets = graph.offsets
+    indices = graph.indices
+
+    if strategy == "bfs":
+        return bfs_frontier_search(graph, start, goal, stats)
+    if strategy == "bidirectional_bfs":
+        return bidirectional_bfs_search(graph, start, goal, stats)
+    if strategy == "bidirectional_dijkstra":
+        return bidirectional_dijkstra_search(graph, start, goal, stats)
+
+    parent = [-1] * n
+    visited = bytearray(n)
+    expanded = 0
+    path = []
+
+    if strategy == "dfs":
+        # Two parallel stacks avoid allocating a tuple for every push
+        stack_nodes = [start]
+        stack_parents = [-1]
+        while stack_nodes:
+            current_node = stack_nodes.pop()
+            previous_node = stack_parents.pop()
+            if visited[current_node]:
+                continue
+            visited[current_node] = 1
+            parent[current_node] = previous_node
+            expanded += 1
+            if current_node == goal:
+                path = build_path(parent, goal)
+                break
+            for neighbor in indices[offsets[current_node]:offsets[current_node + 1]]:
+                if not visited[neighbor]:
+                    stack_nodes.append(neighbor)
+                    stack_parents.append(current_node)
+
+    elif strategy == "dijkstra":
+        parent, settled = dijkstra_tree(graph, start, [goal], stats)
+        return build_path(parent, goal) if settled[goal] else []
+
+    elif strategy == "astar":
+        if not callable(heuristic):
+            heuristic = heuristics[heuristic or "euclidean"]
+        estimates = heuristic(graph, goal)
+        weights = graph.weights
+        best = [math.inf] * n
+        best[start] = 0
+        # Entries are (distance so far + estimate, -distance so far, node, previous node): on equal
+        # estimates the node further along its route is expanded first
+        pq = [(estimates[start], 0, start, -1)]
+        while pq:
+            _, negative_dist, current_node, previous_node = heapq.heappop(pq)
+            dist = -negative_dist
+            # Entries overtaken by a shorter route to their node are skipped. An expanded node is not
+            # closed for good: a heuristic that is admissible but not consistent can reach it again over
+            # a shorter route later, and it is then expanded again so the route stays the shortest
+            if dist > best[current_node]:
+                continue
+            parent[current_node] = previous_node
+            expanded += 1
+            if current_node == goal:
+                path = build_path(parent, goal)
+                break
+            for edge in range(offsets[current_node], offsets[current_node + 1]):
+                neighbor = indices[edge]
+                new_dist = dist + weights[edge]
+                if new_dist < best[neighbor]:
+                    best[neighbor] = new_dist
+                    heapq.heappush(pq, (new_dist + estimates[neighbor], -new_dist, neighbor, current_node))
+
+    else:
+        raise ValueError(f"Unknown search strategy: {strategy}")
+
+    if stats is not None:
+        stats["expanded"] = stats.get("expanded", 0) + expanded
+    # Path stays empty if no path is found to not break functionality
+    return path
+
+# Dijkstra shortest-path tree grown from source until every node in goals is settled (or everything
+# reachable is). Returns the predecessor array and the settled flags; the tree path to any settled node
+# is the same path a Dijkstra search from source to that node returns
+def dijkstra_tree(graph, source, goals, stats=None):
+    n = len(graph)
+    offsets = graph.offsets
+    indices = graph.indices
+    weights = graph.weights
+    parent = [-1] * n
+    settled = bytearray(n)
+    remaining = set(goals)
+    expanded = 0
+    # Best distance pushed so far, entries that cannot win are never pushed
+    best = [math.inf] * n
+    best[source] = 0
+    pq = [(0, source, -1)]
+    while pq and remaining:
+        dist, current_node, previous_node = heapq.heappop(pq)
+        if settled[current_node]:
+            continue
+        # Entries with the same distance and node used to be ordered by their whole path, so on an
+        # exact tie keep the predecessor whose path to current_node sorts first (the path itself, not
+        # the path to the predecessor: [0, 1, 2] sorts before [0, 2] but [0] after [0, 1])
+        while pq and pq[0][0] == dist and pq[0][1] == current_node:
+            other_previous_node = heapq.heappop(pq)[2]
+            if build_path(parent, other_previous_node) + [current_node] < \
+                    build_path(parent, previous_node) + [current_node]:
+                previous_node = other_previous_node
+        settled[current_node] = 1
+        parent[current_node] = previous_node
+        expanded += 1
+        remaining.discard(current_node)
+        for edge in range(offsets[current_node], offsets[current_node + 1]):
+            neighbor = indices[edge]
+            if not settled[neighbor]:
+                new_dist = dist + weights[edge]
+                if new_dist <= best[neighbor]:
+                    best[neighbor] = new_dist
+                    heapq.heappush(pq, (new_dist, neighbor, current_node))
+    if stats is not None:
+        stats["expanded"] = stats.get("expanded", 0) + expanded
+    return parent, settled
+
+# Dijkstra routes for many (start, target, exit) triples on one graph, in the same format as
+# get_dijkstra_path (start left out, [] when a leg is unreachable). Shortest-path trees are shared: one
+# tree is grown from each distinct leg source, so every route is exactly the one dijkstra_route returns.
+# single_pass=True on an undirected graph grows a single tree from each distinct target instead and reads
+# the first leg backwards from it: the route has the same length, but where several routes are equally
+# short the first leg can be another one of them. Every tree is grown once, until all the nodes the
+# routes need from it are settled
+def get_dijkstra_paths(graph, routes, stats=None, single_pass=False):
+    graph = compile_graph(graph)
+    undirected = single_pass and graph.is_undirected()
+    tree_goals = {}
+    for start_node, target_node, exit_node in routes:
+        if undirected:
+            tree_goals.setdefault(target_node, set()).update((start_node, exit_node))
+        else:
+            tree_goals.setdefault(start_node, set()).add(target_node)
+            tree_goals.setdefault(target_node, set()).add(exit_node)
+    trees = {source: dijkstra_tree(graph, source, goals, stats) for source, goals in tree_goals.items()}
+
+    # Tree path from source to node, or [] when the tree could not reach it
+    def tree_path(source, node):
+        parent, settled = trees[source]
+        return build_path(parent, node) if settled[node] else []
+
+    paths = []
+    for start_node, target_node, exit_node in routes:
+        if undirected:
+            start_to_target = tree_path(target_node, start_node)[::-1]
+        else:
+            start_to_target = tree_path(start_node, target_node)
+        target_to_exit = tree_path(target_node, exit_node)
+        if start_to_target and target_to_exit:
+            paths.append((start_to_target[:-1] + target_to_exit)[1:])
+        else:
+            paths.append([])
+    return paths
+
+# BFS expanding a whole level at a time with NumPy. A FIFO queue settles the next level in the order
+# its nodes are first pushed, and each node keeps the first settled neighbor that pushed it, which is
+# exactly the first occurrence of the node in the concatenated neighbor lists of the current level
+def bfs_frontier_search(graph, start, goal, stats=None):
+    visited = np.zeros(len(graph), dtype=bool)
+    parent = np.full(len(graph), -1, dtype=np.intc)
+    visited[start] = True
+    frontier = np.array([start], dtype=np.intc)
+    expanded = 0
+    path = [start] if start == goal else []
+    while frontier.size and not path:
+        expanded += frontier.size
+        neighbors, owners = graph.expand(frontier)
+        unseen = ~visited[neighbors]
+        neighbors = neighbors[unseen]
+        owners = owners[unseen]
+        first_occurrences = np.sort(np.unique(neighbors, return_index=True)[1])
+        frontier = neighbors[first_occurrences]
+        visited[frontier] = True
+        parent[frontier] = owners[first_occurrences]
+        if visited[goal]:
+            path = build_path(parent.tolist(), goal)
+    if stats is not None:
+        stats["expanded"] = stats.get("expanded", 0) + int(expanded)
+    return path
+
+# BFS from both ends at once: levels are expanded from the start on the graph and from the goal on the
+# reversed graph, always on the smaller frontier. The two balls stay disjoint until a level expansion
+# discovers a node the other side has already seen; at that point every shortest route has length
+# (forward depth + backward depth), so the first meeting node found gives a shortest path
+def bidirectional_bfs_search(graph, start, goal, stats=None):
+    if start == goal:
+        return [start]
+    sides = []
+    for side_graph, root in [(graph, start), (graph.reverse(), goal)]:
+        visited = np.zeros(len(graph), dtype=bool)
+        visited[root] = True
+        parent = np.full(len(graph), -1, dtype=np.intc)
+        sides.append([side_graph, visited, parent, np.array([root], dtype=np.intc)])
+    expanded = 0
+    path = []
+    while sides[0][3].size and sides[1][3].size and not path:
+        # Expand the side with the smaller frontier
+        side = 0 if sides[0][3].size <= sides[1][3].size else 1
+        side_graph, visited, parent, frontier = sides[side]
+        other_visited = sides[1 - side][1]
+        expanded += frontier.size
+        neighbors, owners = side_graph.expand(frontier)
+        unseen = ~visited[neighbors]
+        neighbors = neighbors[unseen]
+        owners = owners[unseen]
+        first_occurrences = np.sort(np.unique(neighbors, return_index=True)[1])
+        frontier = neighbors[first_occurrences]
+        visited[frontier] = True
+        parent[frontier] = owners[first_occurrences]
+        sides[side][3] = frontier
+        meetings = frontier[other_visited[frontier]]
+        if meetings.size:
+            path = join_paths(sides[0][2].tolist(), sides[1][2].tolist(), int(meetings[0]))
+    if stats is not None:
+        stats["expanded"] = stats.get("expanded", 0) + int(expanded)
+    return path
+
+# Dijkstra from both ends at once, the backward search runs on the reversed graph. best_route is the
+# shortest start -> goal route seen through any node reached by both searches; once the two smallest
+# keys in the queues add up to at least best_route no shorter route can exist
+def bidirectional_dijkstra_search(graph, start, goal, stats=None):
+    n = len(graph)
+    sides = []
+    for side_graph, root in [(graph, start), (graph.reverse(), goal)]:
+        best = [math.inf] * n
+        best[root] = 0
+        parent = [-1] * n
+        sides.append((side_graph, side_graph.offsets, side_graph.indices, side_graph.weights, best, parent,
+                      bytearray(n), [(0, root)]))
+    best_route = 0 if start == goal else math.inf
+    meeting_node = start if start == goal else -1
+    expanded = 0
+    forward_queue = sides[0][7]
+    backward_queue = sides[1][7]
+    while forward_queue and backward_queue and forward_queue[0][0] + backward_queue[0][0] < best_route:
+        side = 0 if len(forward_queue) <= len(backward_queue) else 1
+        _, offsets, indices, weights, best, parent, settled, pq = sides[side]
+        other_best = sides[1 - side][4]
+        dist, current_node = heapq.heappop(pq)
+        if settled[current_node] or dist > best[current_node]:
+            continue
+        settled[current_node] = 1
+        expanded += 1
+        for edge in range(offsets[current_node], offsets[current_node + 1]):
+            neighbor = indices[edge]
+            new_dist = dist + weights[edge]
+            if new_dist < best[neighbor]:
+                best[neighbor] = new_dist
+                parent[neighbor] = current_node
+                heapq.heappush(pq, (new_dist, neighbor))
+            # Route through this neighbor, using the best known distance on the other side
+            if best[neighbor] + other_best[neighbor] < best_route:
+                best_route = best[neighbor] + other_best[neighbor]
+                meeting_node = neighbor
+    if stats is not None:
+        stats["expanded"] = stats.get("expanded", 0) + expanded
+    if meeting_node == -1:
+        return []
+    return join_paths(sides[0][5], sides[1][5], meeting_node)
+
+# Joins the forward tree path start -> meeting node with the backward tree path meeting node -> goal
+def join_paths(forward_parent, backward_parent, meeting_node):
+    path = build_path(forward_parent, meeting_node)
+    path.extend(reversed(build_path(backward_parent, meeting_node)[:-1]))
+    return path
+
+# Walks the predecessor array back from the goal and returns the path in start-to-goal order
+def build_path(parent, goal):
+    path = []
+    current_node = goal
+    while current_node != -1:
+        path.append(int(current_node))
+        current_node = parent[current_node]
+    path.reverse()
+    return path
+
+# Helper function for Euclidean distance found on Stack Overflow. Uses sqrt (not ** 0.5) so it agrees
+# bit for bit with the vectorized edge weight table in compiled_graph.py
 def calculate_distance(coord1, coord2):
-    return ((coord1[0] - coord2[0]) ** 2 + (coord1[1] - coord2[1]) ** 2) ** 0.5
\ No newline at end of file
+    return math.sqrt((coord1[0] - coord2[0]) ** 2 + (coord1[1] - coord2[1]) ** 2)
\ No newline at end of file
@@ -1,48 +1,391 @@
+import itertools
+import math
+from array import array
+
+import numpy as np
+
 import perm_test_graph_data
+from compiled_graph import compile_graph
 
-def sjt_perms(n):
-    p = list(range(1, n + 1))
-    directions = [-1] * n
-    yield p[:]
-    
-    # Find the largest mobile integer
+# Steinhaus-Johnson-Trotter with Even's speedup. The largest element moves on every step except one in
+# n, so looking for the largest mobile element from n downwards with an inverse position array (and
+# reversing only the elements above it) costs constant amortized time instead of two O(n) passes.
+# Yields the left index i of each adjacent transposition (i, i + 1), n! - 1 of them, or only the ones
+# after permutation number rank when starting part way through
+def sjt_transpositions(n, rank=0):
+    start, direction = sjt_unrank(n, rank)
+    # Sentinels larger than every element at both ends, so no element is mobile past the edge
+    perm = [n + 1] + start + [n + 1]
+    position = [0] * (n + 1)
+    for index in range(1, n + 1):
+        position[perm[index]] = index
     while True:
-        largest_mobile = -1
-        for i in range(n):
-            if directions[i] == -1 and i > 0 and p[i] > p[i - 1] or directions[i] == 1 and i < n - 1 and p[i] > p[i + 1]:
-                if largest_mobile == -1 or p[i] > p[largest_mobile]:
-                    largest_mobile = i
-        if largest_mobile == -1:
+        largest_mobile = n
+        while largest_mobile > 1:
+            if perm[position[largest_mobile] + direction[largest_mobile]] < largest_mobile:
+                break
+            largest_mobile -= 1
+        else:
             return
-        
+
         # Swap the mobile integer in its direction
-        swap_index = largest_mobile + directions[largest_mobile]
-        p[largest_mobile], p[swap_index] = p[swap_index], p[largest_mobile]
-        directions[largest_mobile], directions[swap_index] = directions[swap_index], directions[largest_mobile]
-        largest_mobile = swap_index
-        
+        index = position[largest_mobile]
+        swap_index = index + direction[largest_mobile]
+        other = perm[swap_index]
+        perm[index], perm[swap_index] = other, largest_mobile
+        position[largest_mobile], position[other] = swap_index, index
+
         # Reverse direction of all integers larger than the largest mobile integer
-        for i in range(n):
-            if p[i] > p[largest_mobile]:
-                directions[i] = -directions[i]
+        for larger in range(largest_mobile + 1, n + 1):
+            direction[larger] = -direction[larger]
+
+        yield min(index, swap_index) - 1
+
+
+# Permutation number rank (counting from 0) of 1 .. n in SJT order, and the direction every value is
+# moving in at that point. In SJT order n sweeps across each permutation of 1 .. n-1 in turn, right to
+# left over the even numbered ones and left to right over the odd ones, so writing rank in the mixed
+# radix r_m = r_(m-1) * m + k_m places every value m: it moves left (-1) when r_(m-1) is even
+def sjt_unrank(n, rank):
+    digits = []
+    for m in range(n, 1, -1):
+        rank, offset = divmod(rank, m)
+        digits.append((m, rank, offset))
+    perm = [1] if n >= 1 else []
+    direction = [-1] * (n + 1)
+    for m, lower_rank, offset in reversed(digits):
+        if lower_rank % 2 == 0:
+            perm.insert(m - 1 - offset, m)
+        else:
+            perm.insert(offset, m)
+            direction[m] = 1
+    return perm, direction
+
+
+# Inverse of sjt_unrank: the number of perm (a permutation of 1 .. n) in SJT order. Builds the rank up
+# from value 2, using the position of each value m among the values up to m
+def sjt_rank(perm):
+    rank = 0
+    for m in range(2, len(perm) + 1):
+        position = sum(1 for value in perm[:perm.index(m)] if value < m)
+        rank = rank * m + (m - 1 - position if rank % 2 == 0 else position)
+    return rank
+
+
+# SJT permutations of 1 .. n without a copy per step:
+#   "view"  -> the same read-only memoryview every time, updated in place (copy it to keep one)
+#   "swaps" -> only the transposition indices from sjt_transpositions, after the identity
+def sjt_stream(n, mode="view"):
+    if mode == "swaps":
+        return sjt_transpositions(n)
+    if mode == "view":
+        return sjt_views(n)
+    raise ValueError(f"Unknown SJT mode: {mode}")
+
+
+def sjt_views(n):
+    perm = array('i', range(1, n + 1))
+    view = memoryview(perm).toreadonly()
+    yield view
+    for index in sjt_transpositions(n):
+        perm[index], perm[index + 1] = perm[index + 1], perm[index]
+        yield view
+
+
+def sjt_perms(n):
+    for view in sjt_views(n):
+        yield view.tolist()
+
+
+# Quick necessary conditions for a route 0 -> ... -> n-1 through every node: 0 has a way out, n-1 a way in,
+# every inner node both, and every node lies between 0 and n-1 (reachable from 0 and able to reach n-1)
+def ham_route_possible(graph):
+    exit_node = len(graph) - 1
+    if graph.degree(0) == 0:
+        return False
+    in_degree = np.bincount(graph.indices_np, minlength=len(graph))
+    if in_degree[exit_node] == 0 or any(graph.degree(node) == 0 or in_degree[node] == 0
+                                        for node in range(1, exit_node)):
+        return False
+    return reaches_all(graph, 0) and reaches_all(graph.reverse(), exit_node)
+
+
+def reaches_all(graph, source):
+    adjacency = graph.adjacency_bits()
+    seen = frontier = 1 << source
+    while frontier:
+        reached = 0
+        for bit in bits(frontier):
+            reached |= adjacency[bit.bit_length() - 1]
+        frontier = reached & ~seen
+        seen |= frontier
+    return seen == (1 << len(graph)) - 1
+
+
+# Graphs with no inner nodes have at most the single cycle [0, n-1]
+def short_graph_cycles(graph):
+    return [[0, len(graph) - 1]] if len(graph) and graph.has_edge(0, len(graph) - 1) else []
+
+
+# Held-Karp over the inner nodes 1 .. n-2, with inner node v stored as bit v - 1 of a mask.
+# The forward pass finds, for every set of inner nodes a route from 0 can visit, the nodes it can end on
+# (at most 2^n * n states, far fewer on sparse graphs). The backward pass keeps only the states from which
+# the remaining inner nodes can still be visited on the way to n-1: completes[mask] has bit v set when a
+# route that visited exactly mask and stands on v can finish. Masks are stored from the full mask down,
+# and every route can be walked from 0 without ever backtracking out of a dead end
+def completion_table(graph):
+    inner = len(graph) - 2
+    full = (1 << inner) - 1
+    adjacency = graph.adjacency_bits()
+    successors = [adjacency[node] >> 1 & full for node in range(inner + 1)]
+    layers = [{bit: bit for bit in bits(successors[0])}]
+    while len(layers) < inner and layers[-1]:
+        layer = {}
+        for mask, ends in layers[-1].items():
+            for bit in bits(ends):
+                for step in bits(successors[bit.bit_length()] & ~mask):
+                    layer[mask | step] = layer.get(mask | step, 0) | step
+        layers.append(layer)
 
-        yield p[:]
+    completes = {}
+    exits = sum(1 << (node - 1) for node in range(1, inner + 1) if adjacency[node] >> inner + 1 & 1)
+    if layers[-1].get(full, 0) & exits:
+        completes[full] = layers[-1][full] & exits
+        for layer in reversed(layers[:-1]):
+            for mask, ends in layer.items():
+                good = good_steps(completes, mask, full)
+                row = 0
+                for bit in bits(ends):
+                    if successors[bit.bit_length()] & good:
+                        row |= bit
+                if row:
+                    completes[mask] = row
+    return successors, completes
 
-# Determine if a graph has a Valid Hamiltonian Cycle
-def has_ham_cycle(graph):
-    # Account for 0 and n with a -2
-    n = len(graph) - 2
+
+# Answers questions about the routes 0 -> every other node -> n-1 (the "Hamiltonian cycles" of
+# has_ham_cycle) without enumerating permutations:
+#   "exists"   -> True or False
+#   "count"    -> number of routes
+#   "shortest" -> (length, route) of the shortest route by coordinate distance, or None
+def held_karp(graph, mode="exists"):
+    graph = compile_graph(graph)
+    if len(graph) < 3:
+        routes = short_graph_cycles(graph)
+        if mode == "count":
+            return len(routes)
+        if mode == "shortest":
+            return (path_length(graph, routes[0]), routes[0]) if routes else None
+        return bool(routes)
+    if not ham_route_possible(graph):
+        return {"exists": False, "count": 0, "shortest": None}[mode]
+    successors, completes = completion_table(graph)
+    first_steps = good_steps(completes, 0, successors[0])
+    if mode == "exists":
+        return first_steps != 0
+    if mode == "count":
+        return count_routes(successors, completes, first_steps)
+    if mode == "shortest":
+        return shortest_route(graph, successors, completes, first_steps) if first_steps else None
+    raise ValueError(f"Unknown Held-Karp mode: {mode}")
+
+
+# Inner nodes among candidates that are a good next step after visiting mask
+def good_steps(completes, mask, candidates):
+    good = 0
+    candidates &= ~mask
+    while candidates:
+        bit = candidates & -candidates
+        candidates ^= bit
+        if completes.get(mask | bit, 0) & bit:
+            good |= bit
+    return good
+
+
+# Routes in increasing (lexicographic) order. Only good steps are followed, so every branch ends in a route
+def ham_routes(graph, successors, completes, first_steps):
+    exit_node = len(graph) - 1
+    route = [0]
+    stack = [(0, first_steps)]
+    while stack:
+        mask, steps = stack[-1]
+        if not steps:
+            stack.pop()
+            route.pop()
+            continue
+        bit = steps & -steps
+        stack[-1] = (mask, steps ^ bit)
+        node = bit.bit_length()
+        route.append(node)
+        mask |= bit
+        if mask == (1 << (exit_node - 1)) - 1:
+            yield route + [exit_node]
+            route.pop()
+            continue
+        stack.append((mask, good_steps(completes, mask, successors[node])))
+
+
+# Number of routes finishing from each (mask, node) state, counted from the full mask down
+def count_routes(successors, completes, first_steps):
+    full = (1 << (len(successors) - 1)) - 1
+    counts = {}
+    for mask, ends in completes.items():
+        for bit in bits(ends):
+            if mask == full:
+                counts[(mask, bit)] = 1
+                continue
+            counts[(mask, bit)] = sum(counts[(mask | step, step)]
+                                      for step in bits(good_steps(completes, mask, successors[bit.bit_length()])))
+    return sum(counts[(step, step)] for step in bits(first_steps))
+
+
+# Shortest route by coordinate distance, over the same good steps
+def shortest_route(graph, successors, completes, first_steps):
+    full = (1 << (len(successors) - 1)) - 1
+    exit_node = len(graph) - 1
+    # best[(mask, bit)] = (length of the rest of the route, next bit)
+    best = {}
+    for mask, ends in completes.items():
+        for bit in bits(ends):
+            node = bit.bit_length()
+            if mask == full:
+                best[(mask, bit)] = (calculate_distance(graph, node, exit_node), 0)
+                continue
+            best[(mask, bit)] = min((best[(mask | step, step)][0] + calculate_distance(graph, node, step.bit_length()),
+                                     step) for step in bits(good_steps(completes, mask, successors[node])))
+    length, bit = min((best[(step, step)][0] + calculate_distance(graph, 0, step.bit_length()), step)
+                      for step in bits(first_steps))
+    route = [0]
+    mask = 0
+    while bit:
+        route.append(bit.bit_length())
+        mask |= bit
+        bit = best[(mask, bit)][1]
+    route.append(exit_node)
+    return length, route
+
+
+def bits(mask):
+    while mask:
+        bit = mask & -mask
+        mask ^= bit
+        yield bit
+
+
+def calculate_distance(graph, node, other_node):
+    return math.dist(graph.coordinates[node], graph.coordinates[other_node])
+
+
+def path_length(graph, route):
+    return sum(calculate_distance(graph, route[i], route[i + 1]) for i in range(len(route) - 1))
+
+
+# Depth-first backtracking that only extends the route along real edges, with the visited nodes kept as
+# a bitmask. Streams the same cycles as has_ham_cycle, in increasing order instead of SJT order, one at a time and
+# without building any table, so memory stays at one route no matter how many cycles there are
+def backtrack_ham_cycles(graph):
+    graph = compile_graph(graph)
+    if len(graph) < 3:
+        yield from short_graph_cycles(graph)
+        return
+    if not ham_route_possible(graph):
+        return
+    exit_node = len(graph) - 1
+    exit_bit = 1 << exit_node
+    everything = (1 << len(graph)) - 1
+    successors = graph.adjacency_bits()
+    route = [0]
+    visited = 1
+    stack = [successors[0] & ~visited & ~exit_bit]
+    while stack:
+        steps = stack[-1]
+        if not steps:
+            stack.pop()
+            visited ^= 1 << route.pop()
+            continue
+        bit = steps & -steps
+        stack[-1] = steps ^ bit
+        node = bit.bit_length() - 1
+        visited |= bit
+        route.append(node)
+        if visited | exit_bit == everything:
+            # Every inner node is on the route, it only remains to step onto n-1
+            if successors[node] & exit_bit:
+                yield route + [exit_node]
+            visited ^= bit
+            route.pop()
+            continue
+        stack.append(successors[node] & ~visited & ~exit_bit)
+
+
+# Every permutation checked in SJT order, as has_ham_cycle used to, but incrementally: consecutive SJT
+# permutations differ by one adjacent swap, which changes at most three edges of the cycle. A running
+# count of missing edges is updated for those edges only, using the adjacency bitsets, so each
+# permutation costs O(1) instead of n list scans. Yields the valid cycles in SJT order, optionally only
+# among the count permutations starting at permutation number start (see sjt_unrank)
+def sjt_ham_cycles(graph, start=0, count=None):
+    graph = compile_graph(graph)
+    if len(graph) < 3:
+        if start == 0 and count != 0:
+            yield from short_graph_cycles(graph)
+        return
+    if count is None:
+        count = math.factorial(len(graph) - 2) - start
+    if count <= 0:
+        return
+    adjacent = graph.adjacency_bits()
+    cycle = [0] + sjt_unrank(len(graph) - 2, start)[0] + [len(graph) - 1]
+    missing = sum(not adjacent[cycle[i]] >> cycle[i + 1] & 1 for i in range(len(cycle) - 1))
+    if missing == 0:
+        yield cycle[:]
+    for index in itertools.islice(sjt_transpositions(len(graph) - 2, start), count - 1):
+        # The permutation swap at index moves cycle positions index + 1 and index + 2
+        before, left, right, after = cycle[index:index + 4]
+        missing += (adjacent[before] >> left & 1) + (adjacent[left] >> right & 1) + (adjacent[right] >> after & 1) - \
+                   (adjacent[before] >> right & 1) - (adjacent[right] >> left & 1) - (adjacent[left] >> after & 1)
+        cycle[index + 1], cycle[index + 2] = right, left
+        if missing == 0:
+            yield cycle[:]
+
+
+# Backtracking search for Hamiltonian cycles:
+#   "find_first" -> the first cycle, or None (stops as soon as it is found)
+#   "find_all"   -> a generator over every cycle
+#   "count"      -> number of cycles, counted while streaming
+def find_ham_cycles(graph, mode="find_all"):
+    cycles = backtrack_ham_cycles(graph)
+    if mode == "find_all":
+        return cycles
+    if mode == "find_first":
+        return next(cycles, None)
+    if mode == "count":
+        return sum(1 for _ in cycles)
+    raise ValueError(f"Unknown backtracking mode: {mode}")
+
+
+# Determine if a graph has a Valid Hamiltonian Cycle (a route from 0 through every node to n-1).
+# mode "all" returns every cycle (in SJT order of the inner nodes), "first" only the first one and "shortest" only
+# the shortest by coordinate distance. Any mode returns -1 if no valid cycles exist
+def has_ham_cycle(graph, mode="all"):
+    # Works on the compiled form so nested lists and CompiledGraphs are both accepted
+    graph = compile_graph(graph)
     ham_cycles = []
-    
-    for perm in sjt_perms(n):
-        cycle = [0] + perm + [len(graph) - 1]
-        
-        # Test to see if cycle is valid
-        valid_cycle = all(cycle[i + 1] in graph[cycle[i]][1] for i in range(len(cycle) - 1))
-        
-        if valid_cycle:
-            ham_cycles.append(cycle)
-    
+
+    if len(graph) < 3:
+        ham_cycles.extend(short_graph_cycles(graph))
+    elif ham_route_possible(graph):
+        successors, completes = completion_table(graph)
+        first_steps = good_steps(completes, 0, successors[0])
+        if mode == "shortest":
+            if first_steps:
+                ham_cycles.append(shortest_route(graph, successors, completes, first_steps)[1])
+        else:
+            ham_cycles.extend(ham_routes(graph, successors, completes, first_steps))
+            # Same order as checking every SJT permutation of the inner nodes, as this function always has
+            ham_cycles.sort(key=lambda cycle: sjt_rank(cycle[1:-1]))
+            if mode == "first":
+                del ham_cycles[1:]
+
     # Print and return all valid Hamiltonian cycles or return -1 if no valid cycles exist
     if ham_cycles:
         for cycle in ham_cycles:
@@ -1,45 +1,115 @@
+import math
+
 import config_data
 import global_game_data
 import graph_data
-import sys
+from compiled_graph import compile_graph
+
+
+# Maps graph coordinates to window coordinates for one graph, window size, zoom and pan. The graph bounds
+# are read once from the compiled graph's coordinate array, and apply() transforms whole arrays of points.
+# At zoom 1 and no pan the whole graph fits the display area; zoom scales it and pan (in window pixels)
+# moves it from there
+class ViewportTransform:
+
+    def __init__(self, coordinates, window_width, window_height, zoom=1.0, pan=(0.0, 0.0)):
+        self.min_x, self.min_y = coordinates.min(axis=0).tolist()
+        max_x, max_y = coordinates.max(axis=0).tolist()
+        max_display_width = window_width - config_data.display_size_left - config_data.display_size_right - 2 \
+                            * config_data.graph_padding
+        max_display_height = window_height - config_data.display_size_top - \
+                             config_data.display_size_bottom - 2 * config_data.graph_padding
+        # A graph with no extent in one direction is drawn along the edge instead of dividing by zero
+        self.scale_x = max_display_width / (max_x - self.min_x) * zoom if max_x > self.min_x else 0
+        self.scale_y = max_display_height / (max_y - self.min_y) * zoom if max_y > self.min_y else 0
+        self.offset_x = config_data.graph_padding + config_data.display_size_left + pan[0]
+        self.offset_y = config_data.graph_padding + config_data.display_size_bottom + pan[1]
+        self.range_x = max_x - self.min_x
+        # Part of the window the graph is drawn in, left, bottom, right, top
+        self.display_area = (config_data.display_size_left, config_data.display_size_bottom,
+                             window_width - config_data.display_size_right, window_height - config_data.display_size_top)
+
+    def x(self, absolute_x_value):
+        return (absolute_x_value - self.min_x) * self.scale_x + self.offset_x
+
+    def y(self, absolute_y_value):
+        return (absolute_y_value - self.min_y) * self.scale_y + self.offset_y
+
+    # points is a NumPy array whose last axis holds x, y pairs (for example (n, 2) nodes or (n, 4) lines)
+    def apply(self, points):
+        shape = points.shape
+        pairs = points.reshape(-1, 2)
+        transformed = (pairs - (self.min_x, self.min_y)) * (self.scale_x, self.scale_y) + (self.offset_x, self.offset_y)
+        return transformed.reshape(shape)
+
+    # Graph coordinates (min_x, min_y, max_x, max_y) of the display area widened by margin pixels on every
+    # side. Unbounded along an axis the graph has no extent in
+    def visible_bounds(self, margin=0):
+        left, bottom, right, top = self.display_area
+        if self.scale_x:
+            min_x = (left - margin - self.offset_x) / self.scale_x + self.min_x
+            max_x = (right + margin - self.offset_x) / self.scale_x + self.min_x
+        else:
+            min_x, max_x = -math.inf, math.inf
+        if self.scale_y:
+            min_y = (bottom - margin - self.offset_y) / self.scale_y + self.min_y
+            max_y = (top + margin - self.offset_y) / self.scale_y + self.min_y
+        else:
+            min_y, max_y = -math.inf, math.inf
+        return min_x, min_y, max_x, max_y
+
+
+_transform = None
+_transform_key = None
+
+
+# Transform for the current graph and window, rebuilt only when either of them changes
+def get_viewport_transform():
+    global _transform, _transform_key
+    compiled = compile_graph(graph_data.graph_data[global_game_data.current_graph_index], verify=False)
+    # Moving nodes with CompiledGraph.set_coordinates replaces the coordinate array, which also counts
+    key = (compiled, compiled.coordinates, config_data.window_width, config_data.window_height,
+           global_game_data.view_zoom, tuple(global_game_data.view_pan))
+    if _transform is None or key[0] is not _transform_key[0] or key[1] is not _transform_key[1] or \
+            key[2:] != _transform_key[2:]:
+        _transform = ViewportTransform(compiled.coordinates, config_data.window_width, config_data.window_height,
+                                       global_game_data.view_zoom, global_game_data.view_pan)
+        _transform_key = key
+    return _transform
+
+
+# Zooms the view by factor, keeping the graph point under window position (window_x, window_y) in place
+def zoom_view(factor, window_x, window_y):
+    zoom = min(max(global_game_data.view_zoom * factor, config_data.min_zoom), config_data.max_zoom)
+    factor = zoom / global_game_data.view_zoom
+    base_x = config_data.graph_padding + config_data.display_size_left
+    base_y = config_data.graph_padding + config_data.display_size_bottom
+    pan_x, pan_y = global_game_data.view_pan
+    global_game_data.view_zoom = zoom
+    global_game_data.view_pan = [window_x - base_x - (window_x - base_x - pan_x) * factor,
+                                 window_y - base_y - (window_y - base_y - pan_y) * factor]
+
+
+# Moves the view by a distance in window pixels
+def pan_view(change_in_x, change_in_y):
+    global_game_data.view_pan = [global_game_data.view_pan[0] + change_in_x,
+                                 global_game_data.view_pan[1] + change_in_y]
+
+
+def reset_view():
+    global_game_data.view_zoom = 1.0
+    global_game_data.view_pan = [0.0, 0.0]
 
 
 def get_relative_graph_x(absolute_x_value):
-    max_x_graph = sys.float_info.min
-    min_x_graph = sys.float_info.max
-    for graph_point in graph_data.graph_data[global_game_data.current_graph_index]:
-        if graph_point[0][0] < min_x_graph:
-            min_x_graph = graph_point[0][0]
-        if graph_point[0][0] > max_x_graph:
-            max_x_graph = graph_point[0][0]
-    max_display_width = config_data.window_width - config_data.display_size_left - config_data.display_size_right - 2 \
-                        * config_data.graph_padding
-    return (absolute_x_value - min_x_graph) * max_display_width / (max_x_graph - min_x_graph) + \
-           config_data.graph_padding + config_data.display_size_left
+    return get_viewport_transform().x(absolute_x_value)
 
 
 def get_relative_graph_y(absolute_y_value):
-    max_y_graph = sys.float_info.min
-    min_y_graph = sys.float_info.max
-    for graph_point in graph_data.graph_data[global_game_data.current_graph_index]:
-        if graph_point[0][1] < min_y_graph:
-            min_y_graph = graph_point[0][1]
-        if graph_point[0][1] > max_y_graph:
-            max_y_graph = graph_point[0][1]
-    max_display_height = config_data.window_height - config_data.display_size_top - \
-                         config_data.display_size_bottom - 2 * config_data.graph_padding
-    return (absolute_y_value - min_y_graph) * max_display_height / (
-            max_y_graph - min_y_graph) + config_data.graph_padding + config_data.display_size_bottom
+    return get_viewport_transform().y(absolute_y_value)
 
 
 def get_absolute_speed():
-    max_x_graph = sys.float_info.min
-    min_x_graph = sys.float_info.max
-    for graph_point in graph_data.graph_data[global_game_data.current_graph_index]:
-        if graph_point[0][0] < min_x_graph:
-            min_x_graph = graph_point[0][0]
-        if graph_point[0][0] > max_x_graph:
-            max_x_graph = graph_point[0][0]
-    range_of_x_values = max_x_graph - min_x_graph
+    range_of_x_values = get_viewport_transform().range_x
     speed_coefficient = 1 / 5
     return config_data.player_speed * range_of_x_values * speed_coefficient
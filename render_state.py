@@ -0,0 +1,68 @@
+# Change tracking and frame timing for the game display. Nothing here imports pyglet.
+#
+# Graph.update_graph runs on every tick, but most ticks change nothing on screen except the current
+# player's position. RenderState remembers what each part of the display was last drawn from, so the
+# graph is only repositioned and the path only rebuilt when their inputs change.
+# FrameTimer keeps the duration of recent frames so the cost of a tick can be watched while playing
+# (config_data.report_frame_times).
+
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class RenderState:
+
+    def __init__(self):
+        self.keys = {}
+
+    # True when key differs from the key name was last drawn from (or name was never drawn), and
+    # remembers key. Keys are compared with ==, objects without __eq__ (like the viewport transform)
+    # by identity
+    def changed(self, name, key):
+        if name in self.keys and self.keys[name] == key:
+            return False
+        self.keys[name] = key
+        return True
+
+    # Forces name (or everything) to be drawn again on the next check
+    def invalidate(self, name=None):
+        if name is None:
+            self.keys.clear()
+        else:
+            self.keys.pop(name, None)
+
+
+class FrameTimer:
+
+    def __init__(self, window=600):
+        # Seconds taken by the most recent frames
+        self.durations = deque(maxlen=window)
+        self.frames = 0
+
+    @contextmanager
+    def measure(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations.append(time.perf_counter() - started)
+            self.frames += 1
+
+    # Mean, median, 99th percentile and longest frame in milliseconds over the recent frames
+    def stats(self):
+        if not self.durations:
+            return {"frames": self.frames, "mean_ms": None, "p50_ms": None, "p99_ms": None, "max_ms": None}
+        durations = np.array(self.durations) * 1000
+        p50, p99 = np.percentile(durations, [50, 99]).tolist()
+        return {"frames": self.frames, "mean_ms": float(durations.mean()), "p50_ms": p50, "p99_ms": p99,
+                "max_ms": float(durations.max())}
+
+    def report(self):
+        stats = self.stats()
+        if stats["mean_ms"] is None:
+            return "No frames yet"
+        return f"{stats['frames']} frames, mean {stats['mean_ms']:.3f} ms, p50 {stats['p50_ms']:.3f} ms, " \
+               f"p99 {stats['p99_ms']:.3f} ms, max {stats['max_ms']:.3f} ms"
@@ -17,10 +17,12 @@ class Scoreboard:
     def __init__(self, batch, group):
         self.batch = batch
         self.group = group
-        self.stat_height = 32
         self.stat_width = 400
         self.number_of_stats = 6 # Update to 6 for new statistic
         self.base_height_offset = 20
+        # Shrink the rows when there are too many players to fit every stat in the window
+        self.stat_height = min(32, (config_data.window_height - self.base_height_offset) //
+                               (len(config_data.player_data) * self.number_of_stats + 2))
         self.font_size = 16
         self.distance_to_exit_label = pyglet.text.Label('Direct Distance To Exit : 0', x=0, y=0,
                                                         font_name='Arial', font_size=self.font_size, batch=batch, group=group)
@@ -0,0 +1,115 @@
+# Simulation core for the players: every player's position, objective, distance traveled and visited
+# nodes live in NumPy arrays, and one step moves all moving players at once. Player objects are views
+# onto one row of these arrays. Nothing here imports pyglet.
+#
+# The simulation runs at a fixed timestep of its own. advance() is given the time since the last frame
+# and runs as many whole steps as fit in it, carrying the remainder to the next frame, so the movement
+# is the same whatever the render rate. In relay mode (the game) the players take turns along their
+# paths like Player.update used to do: one player moves, and when its path is done the next one starts,
+# until all have run and everything resets. Otherwise all players move at once until their paths end.
+
+import numpy as np
+
+
+class Simulation:
+
+    def __init__(self, speed, timestep=1 / 120, relay=True, max_steps=8):
+        self.speed = speed
+        self.timestep = timestep
+        self.relay = relay
+        # Steps run per advance() at most, a long stall skips time instead of running a burst of steps
+        self.max_steps = max_steps
+        self.accumulated = 0.0
+        self.steps = 0
+        self.current = 0
+        self.load(np.zeros((1, 2)), [])
+
+    # Starts over on a graph (its (n, 2) coordinate array) with one player per path
+    def load(self, coordinates, paths):
+        self.coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        self.count = len(paths)
+        self.lengths = np.array([len(path) for path in paths], dtype=np.int64)
+        self.paths = np.zeros((self.count, max(self.lengths.max(initial=0), 1)), dtype=np.int64)
+        for player, path in enumerate(paths):
+            self.paths[player, :len(path)] = path
+        # distinct_counts[p, i] = number of different nodes among the first i + 1 nodes of path p. A player
+        # has visited exactly the nodes of its path up to the furthest objective it has headed for
+        # (reached), so its visited count is one lookup and memory grows with the paths, not the graph
+        self.distinct_counts = np.zeros_like(self.paths)
+        for player, path in enumerate(paths):
+            first_visits = np.zeros(len(path), dtype=np.int64)
+            first_visits[np.unique(np.asarray(path, dtype=np.int64), return_index=True)[1]] = 1
+            self.distinct_counts[player, :len(path)] = np.cumsum(first_visits)
+        self.positions = np.zeros((self.count, 2))
+        self.objectives = np.zeros(self.count, dtype=np.int64)
+        self.distances = np.zeros(self.count)
+        self.reached = np.full(self.count, -1, dtype=np.int64)
+        self.visited_counts = np.zeros(self.count, dtype=np.int64)
+        self.accumulated = 0.0
+        self.current = 0
+        self.reset()
+
+    # Puts players (an index, array of indices or None for all) back at the start node
+    def reset(self, players=None):
+        players = slice(None) if players is None else players
+        if len(self.coordinates):
+            self.positions[players] = self.coordinates[0]
+        self.objectives[players] = 0
+        self.distances[players] = 0
+        self.reached[players] = -1
+        self.visited_counts[players] = 0
+
+    # Nodes a player has visited since its last reset
+    def visited_nodes(self, player):
+        return set(self.paths[player, :self.reached[player] + 1].tolist())
+
+    # Runs the whole timesteps that fit in elapsed seconds plus the time carried over, returns how many
+    def advance(self, elapsed):
+        self.accumulated += elapsed
+        steps = min(int(self.accumulated // self.timestep), self.max_steps)
+        self.accumulated = min(self.accumulated - steps * self.timestep, self.timestep)
+        for _ in range(steps):
+            self.step()
+        return steps
+
+    def step(self):
+        self.steps += 1
+        if not self.relay:
+            self.move(np.flatnonzero(self.objectives < self.lengths))
+            return
+        # Every player has had its turn
+        if not 0 <= self.current < self.count:
+            self.current = 0
+            self.reset()
+            return
+        # Hand over to the next player with a path left, the finished ones start their next turn from the
+        # beginning of their path
+        while self.current < self.count and self.objectives[self.current] >= self.lengths[self.current]:
+            self.objectives[self.current] = 0
+            self.current += 1
+        if self.current < self.count:
+            self.move(np.array([self.current]))
+
+    # One timestep for the given players: each moves speed * timestep toward its next objective, stopping on
+    # it instead of overshooting, and goes on to the following objective once it is there
+    def move(self, players):
+        if not len(players):
+            return
+        objectives = self.objectives[players]
+        nodes = self.paths[players, objectives]
+        targets = self.coordinates[nodes]
+        positions = self.positions[players]
+        differences = targets - positions
+        lengths = np.sqrt(differences[:, 0] * differences[:, 0] + differences[:, 1] * differences[:, 1])[:, None]
+        changes = np.divide(differences, lengths, out=np.zeros_like(differences), where=lengths > 0) * \
+            self.speed * self.timestep
+        moved = positions + changes
+        overshot = (positions == targets) | ((positions < targets) & (targets < moved)) | \
+                   ((moved < targets) & (targets < positions))
+        moved = np.where(overshot, targets, moved)
+        steps = positions - moved
+        self.distances[players] += np.sqrt(steps[:, 0] * steps[:, 0] + steps[:, 1] * steps[:, 1])
+        self.positions[players] = moved
+        self.reached[players] = np.maximum(self.reached[players], objectives)
+        self.visited_counts[players] = self.distinct_counts[players, self.reached[players]]
+        self.objectives[players[(moved == targets).all(axis=1)]] += 1
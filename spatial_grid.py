@@ -0,0 +1,56 @@
+# Uniform grid over node coordinates for finding the nodes inside a rectangle, used to draw only the
+# part of the graph that is on screen (Graph.resize_graph).
+#
+# Cells are square, sized so an average cell holds about nodes_per_cell nodes. Nodes are stored sorted
+# by cell, column by column, with offsets into that order like the CSR arrays of CompiledGraph:
+#   nodes[offsets[c]:offsets[c+1]] = nodes in cell c, where c = column * rows + row
+# so the cells of one column inside a rectangle are a single contiguous slice, and a query touches
+# about as many nodes as the rectangle holds plus the cells along its border.
+
+import math
+
+import numpy as np
+
+
+class SpatialGrid:
+
+    def __init__(self, coordinates, nodes_per_cell=4):
+        self.coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        count = len(self.coordinates)
+        self.origin = self.coordinates.min(axis=0) if count else np.zeros(2)
+        extent = self.coordinates.max(axis=0) - self.origin if count else np.zeros(2)
+        self.cell_size = cell_size_for(extent, count, nodes_per_cell)
+        self.columns, self.rows = (np.floor(extent / self.cell_size).astype(np.int64) + 1).tolist()
+        cells = self.cell_of(self.coordinates)
+        keys = cells[:, 0] * self.rows + cells[:, 1]
+        self.nodes = np.argsort(keys, kind='stable')
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(keys, minlength=self.columns * self.rows))))
+
+    # (column, row) of every point, points outside the grid are clipped to its border cells
+    def cell_of(self, points):
+        cells = np.floor((points - self.origin) / self.cell_size)
+        return np.clip(cells, 0, (self.columns - 1, self.rows - 1)).astype(np.int64)
+
+    # Nodes with min_x <= x <= max_x and min_y <= y <= max_y, in increasing order. Bounds may be infinite
+    def query(self, min_x, min_y, max_x, max_y):
+        if not len(self.coordinates) or min_x > max_x or min_y > max_y:
+            return np.empty(0, dtype=np.int64)
+        low, high = self.cell_of(np.array([[min_x, min_y], [max_x, max_y]])).tolist()
+        candidates = [self.nodes[self.offsets[column * self.rows + low[1]]:
+                                 self.offsets[column * self.rows + high[1] + 1]]
+                      for column in range(low[0], high[0] + 1)]
+        candidates = np.concatenate(candidates)
+        points = self.coordinates[candidates]
+        inside = (points[:, 0] >= min_x) & (points[:, 0] <= max_x) & (points[:, 1] >= min_y) & \
+                 (points[:, 1] <= max_y)
+        return np.sort(candidates[inside])
+
+
+# Side of a square cell holding about nodes_per_cell of count nodes spread over extent. It is never
+# smaller than splitting the longer side alone, so a long thin (or flat) graph does not get more cells
+# than nodes, and a single point gets one cell
+def cell_size_for(extent, count, nodes_per_cell):
+    width, height = extent.tolist()
+    if count == 0 or (width == 0 and height == 0):
+        return 1.0
+    return max(math.sqrt(width * height * nodes_per_cell / count), max(width, height) * nodes_per_cell / count)
@@ -0,0 +1,112 @@
+# Graph fixtures and reference implementations shared by unit_test.py and benchmarks.py
+
+import heapq
+from collections import deque
+
+from numpy import random
+
+
+# Generates a graph in the graph_data format: a jittered grid of roughly n nodes where every node is
+# connected to its right and lower neighbors (both directions) plus a few random diagonals.
+# Node 0 is the top left corner and node n - 1 the bottom right corner, like the hand made graphs.
+# jitter=0 gives an exact grid, where many routes have exactly the same length
+def generate_graph(n, seed=0, diagonal_chance=0.2, jitter=20):
+    rng = random.default_rng(seed)
+    width = max(2, int(n ** 0.5))
+    height = max(1, (n + width - 1) // width)
+    count = width * height
+    offsets = rng.uniform(-jitter, jitter, size=(count, 2))
+    graph = []
+    for index in range(count):
+        row, column = divmod(index, width)
+        x = int(column * 100 + offsets[index][0])
+        y = int(-row * 100 + offsets[index][1])
+        graph.append([(x, y), []])
+
+    def connect(a, b):
+        graph[a][1].append(b)
+        graph[b][1].append(a)
+
+    diagonals = rng.random(count) < diagonal_chance
+    for index in range(count):
+        row, column = divmod(index, width)
+        if column + 1 < width:
+            connect(index, index + 1)
+        if row + 1 < height:
+            connect(index, index + width)
+            if diagonals[index] and column + 1 < width:
+                connect(index, index + width + 1)
+    return graph
+
+
+# Euclidean distance with the formula pathing.calculate_distance used before the CSR weight table, so the
+# reference searches keep the original edge weights bit for bit
+def reference_distance(coord1, coord2):
+    return ((coord1[0] - coord2[0]) ** 2 + (coord1[1] - coord2[1]) ** 2) ** 0.5
+
+
+# Path-copying reference searches: this is how DFS, BFS and Dijkstra were written before the shared
+# parent-pointer core in pathing.search, kept to compare against it
+def reference_search(graph, start, goal, strategy):
+    visited = set()
+    if strategy == "dfs":
+        stack = [(start, [start])]
+        while stack:
+            current_node, path = stack.pop()
+            if current_node in visited:
+                continue
+            visited.add(current_node)
+            if current_node == goal:
+                return path
+            for neighbor in graph[current_node][1]:
+                if neighbor not in visited:
+                    stack.append((neighbor, path + [neighbor]))
+    elif strategy == "bfs":
+        queue = deque([(start, [start])])
+        while queue:
+            current_node, path = queue.popleft()
+            if current_node in visited:
+                continue
+            visited.add(current_node)
+            if current_node == goal:
+                return path
+            for neighbor in graph[current_node][1]:
+                if neighbor not in visited:
+                    queue.append((neighbor, path + [neighbor]))
+    elif strategy == "dijkstra":
+        pq = [(0, start, [start])]
+        while pq:
+            dist, current_node, path = heapq.heappop(pq)
+            if current_node in visited:
+                continue
+            visited.add(current_node)
+            if current_node == goal:
+                return path
+            for neighbor in graph[current_node][1]:
+                if neighbor not in visited:
+                    edge_weight = reference_distance(graph[current_node][0], graph[neighbor][0])
+                    heapq.heappush(pq, (dist + edge_weight, neighbor, path + [neighbor]))
+    return []
+
+
+# SJT as it was written before Even's speedup: two O(n) passes and a copy for every permutation
+def reference_sjt_perms(n):
+    p = list(range(1, n + 1))
+    directions = [-1] * n
+    yield p[:]
+    while True:
+        largest_mobile = -1
+        for i in range(n):
+            if directions[i] == -1 and i > 0 and p[i] > p[i - 1] or directions[i] == 1 and i < n - 1 and p[i] > p[i + 1]:
+                if largest_mobile == -1 or p[i] > p[largest_mobile]:
+                    largest_mobile = i
+        if largest_mobile == -1:
+            return
+        swap_index = largest_mobile + directions[largest_mobile]
+        p[largest_mobile], p[swap_index] = p[swap_index], p[largest_mobile]
+        directions[largest_mobile], directions[swap_index] = directions[swap_index], directions[largest_mobile]
+        largest_mobile = swap_index
+        for i in range(n):
+            if p[i] > p[largest_mobile]:
+                directions[i] = -directions[i]
+        yield p[:]
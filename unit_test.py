@@ -1,14 +1,56 @@
+import asyncio
+import io
+import json
 import math
+import mmap
+import os
+import subprocess
+import sys
+import tempfile
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import graph_data
 import global_game_data
-from pathing import get_random_path, get_dfs_path, get_bfs_path, get_dijkstra_path, calculate_distance
-from permutation import sjt_perms, has_ham_cycle
+import pathing
+from pathing import get_random_path, get_dfs_path, get_bfs_path, get_dijkstra_path, get_astar_path, get_dijkstra_paths, calculate_distance, search, find_path, cached_find_path
+from permutation import sjt_perms, sjt_stream, sjt_ham_cycles, sjt_rank, sjt_unrank, has_ham_cycle, held_karp, find_ham_cycles
 import perm_test_graph_data
-from f_w import reconstruct_path, floyd_warshall
+from f_w import reconstruct_path, floyd_warshall, all_pairs_shortest_paths, choose_apsp_mode
+from test_helpers import generate_graph, reference_search, reference_sjt_perms
+import compiled_graph
+from compiled_graph import CompiledGraph, compile_graph
+import apsp_store
+import parallel_engine
+from parallel_engine import ParallelEngine
+import headless
+from path_service import PathService
+from path_cache import PathCache
 
 
 
+# Total Euclidean length of a path through the given graph
+def get_path_length(graph, path):
+    return sum(calculate_distance(graph[path[i]][0], graph[path[i + 1]][0]) for i in range(len(path) - 1))
+
+
+# Every Hamiltonian cycle found by checking each SJT permutation, the way has_ham_cycle used to
+def get_ham_cycles_by_permutation(graph):
+    edges = compile_graph(graph)
+    cycles = []
+    for perm in sjt_perms(len(graph) - 2):
+        cycle = [0] + perm + [len(graph) - 1]
+        if all(edges.has_edge(cycle[i], cycle[i + 1]) for i in range(len(cycle) - 1)):
+            cycles.append(cycle)
+    return cycles
+
+
+# Run in a ParallelEngine worker: True if its graph arrays are views of the shared memory blocks
+def worker_graph_is_shared(_):
+    graph = parallel_engine._worker_graph
+    return all(isinstance(values.base, mmap.mmap) for values in (graph.offsets_np, graph.indices_np, graph.weights_np))
+
+
 class TestPathFinding(unittest.TestCase):
 
     def test_upper(self):
@@ -61,7 +103,7 @@ class TestPathFinding(unittest.TestCase):
         path = get_random_path()
         graph = graph_data.graph_data[global_game_data.current_graph_index]
         for i in range(len(path) - 1):
-            self.assertIn(path[i+1], graph[path[i]][1], "Each step in the path should only move to a neighbor")
+            self.assertTrue(compile_graph(graph).has_edge(path[i], path[i+1]), "Each step in the path should only move to a neighbor")
             
     # DFS
     def test_dfs_path_valid_start_and_exit(self):
@@ -81,7 +123,7 @@ class TestPathFinding(unittest.TestCase):
         path = get_dfs_path()
         graph = graph_data.graph_data[global_game_data.current_graph_index]
         for i in range(len(path) - 1):
-            self.assertIn(path[i+1], graph[path[i]][1], "DFS Path should only move to a neighbor")
+            self.assertTrue(compile_graph(graph).has_edge(path[i], path[i+1]), "DFS Path should only move to a neighbor")
             
     def test_dfs_path_reaches_exit(self):
         # Test that the path reaches the exit upon ending
@@ -112,7 +154,7 @@ class TestPathFinding(unittest.TestCase):
         path = get_bfs_path()
         graph = graph_data.graph_data[global_game_data.current_graph_index]
         for i in range(len(path) - 1):
-            self.assertIn(path[i+1], graph[path[i]][1], "BFS Path should only move to a neighbor")
+            self.assertTrue(compile_graph(graph).has_edge(path[i], path[i+1]), "BFS Path should only move to a neighbor")
             
     def test_bfs_path_reaches_exit(self):
         # Test that the path reaches the exit upon ending
@@ -139,6 +181,25 @@ class TestPathFinding(unittest.TestCase):
         expected = [[1, 2], [2, 1]]
         self.assertEqual(perms, expected, "SJT permutations failed for n=2")
 
+    def test_sjt_stream_matches_original(self):
+        for n in range(8):
+            expected = list(reference_sjt_perms(n))
+            self.assertEqual(list(sjt_perms(n)), expected, f"SJT order changed for n={n}")
+            self.assertEqual([view.tolist() for view in sjt_stream(n, "view")], expected)
+            perm = list(range(1, n + 1))
+            perms = [perm[:]]
+            for index in sjt_stream(n, "swaps"):
+                perm[index], perm[index + 1] = perm[index + 1], perm[index]
+                perms.append(perm[:])
+            self.assertEqual(perms, expected, f"SJT transpositions wrong for n={n}")
+
+    def test_sjt_view_is_reused_and_read_only(self):
+        views = sjt_stream(4, "view")
+        first = next(views)
+        self.assertIs(next(views), first)
+        with self.assertRaises(TypeError):
+            first[0] = 2
+
     def test_ham_cycle_exists(self):
         # Test with a graph known to have a Hamiltonian cycle
         result = has_ham_cycle(graph_data.graph_data[0])
@@ -148,6 +209,48 @@ class TestPathFinding(unittest.TestCase):
         # Test with a graph known to have no Hamiltonian cycle
         result = has_ham_cycle(perm_test_graph_data.perm_test_graph_data[0])
         self.assertEqual(result, -1, "Expected no Hamiltonian cycle but found one")
+
+    def test_held_karp_matches_permutations(self):
+        graphs = [graph for graph in graph_data.graph_data + perm_test_graph_data.perm_test_graph_data if len(graph) <= 11]
+        for graph in graphs:
+            expected = get_ham_cycles_by_permutation(graph)
+            self.assertEqual(list(sjt_ham_cycles(graph)), expected, "Incremental edge check should match the full check")
+            result = has_ham_cycle(graph)
+            self.assertEqual(result, expected if expected else -1)
+            self.assertEqual(held_karp(graph), bool(expected))
+            self.assertEqual(held_karp(graph, "count"), len(expected))
+            if expected:
+                length, cycle = held_karp(graph, "shortest")
+                self.assertIn(cycle, expected)
+                self.assertAlmostEqual(length, min(get_path_length(graph, cycle) for cycle in expected), delta=1e-9)
+                self.assertEqual(has_ham_cycle(graph, "shortest"), [cycle])
+                self.assertEqual(has_ham_cycle(graph, "first"), [expected[0]])
+            else:
+                self.assertIsNone(held_karp(graph, "shortest"))
+
+    def test_backtracking_matches_permutations(self):
+        graphs = [graph for graph in graph_data.graph_data + perm_test_graph_data.perm_test_graph_data if len(graph) <= 11]
+        for graph in graphs:
+            # Backtracking yields the cycles in increasing order, has_ham_cycle in SJT order
+            expected = has_ham_cycle(graph)
+            expected = [] if expected == -1 else sorted(expected)
+            self.assertEqual(list(find_ham_cycles(graph)), expected)
+            self.assertEqual(find_ham_cycles(graph, "count"), len(expected))
+            self.assertEqual(find_ham_cycles(graph, "find_first"), expected[0] if expected else None)
+
+    def test_sjt_rank_inverts_unrank(self):
+        for n in range(1, 7):
+            for rank in range(math.factorial(n)):
+                self.assertEqual(sjt_rank(sjt_unrank(n, rank)[0]), rank)
+
+    def test_backtracking_streams_cycles(self):
+        # The 24 node graph has 165 cycles, the first one arrives without visiting the rest of the search
+        cycles = find_ham_cycles(graph_data.graph_data[2])
+        first = next(cycles)
+        self.assertEqual(len(first), 24)
+        self.assertEqual(len(set(first)), 24)
+        self.assertTrue(all(first[i + 1] in graph_data.graph_data[2][first[i]][1] for i in range(23)))
+        self.assertEqual(1 + sum(1 for _ in cycles), 165)
         
     # Dijkstra
     def test_dijkstra_valid_path(self):
@@ -166,8 +269,253 @@ class TestPathFinding(unittest.TestCase):
         path = get_dijkstra_path()
         graph = graph_data.graph_data[global_game_data.current_graph_index]
         for i in range(len(path) - 1):
-            self.assertIn(path[i + 1], graph[path[i]][1], f"Edge {path[i]} -> {path[i + 1]} must exist")
+            self.assertTrue(compile_graph(graph).has_edge(path[i], path[i + 1]), f"Edge {path[i]} -> {path[i + 1]} must exist")
             
+    # A*
+    def test_astar_matches_dijkstra_length(self):
+        for graph_index, graph in enumerate(graph_data.graph_data):
+            global_game_data.current_graph_index = graph_index
+            for target_node in range(1, len(graph) - 1):
+                global_game_data.target_node[graph_index] = target_node
+                astar_path = get_astar_path()
+                dijkstra_path = get_dijkstra_path()
+                self.assertIn(target_node, astar_path, "A* path should include the target node")
+                self.assertAlmostEqual(get_path_length(graph, [0] + astar_path), get_path_length(graph, [0] + dijkstra_path),
+                                       delta=1e-9, msg=f"A* route on graph {graph_index} should be as short as Dijkstra's")
+
+    def test_astar_expands_fewer_nodes(self):
+        graph = generate_graph(2500, seed=1)
+        global_game_data.target_node[global_game_data.current_graph_index] = len(graph) // 2
+        astar_stats = {}
+        dijkstra_stats = {}
+        get_astar_path(graph, stats=astar_stats)
+        get_dijkstra_path(graph, stats=dijkstra_stats)
+        self.assertLess(astar_stats["expanded"], dijkstra_stats["expanded"], "A* should expand fewer nodes than Dijkstra")
+        zero_stats = {}
+        get_astar_path(graph, heuristic="zero", stats=zero_stats)
+        self.assertEqual(zero_stats["expanded"], dijkstra_stats["expanded"], "A* without a heuristic expands like Dijkstra")
+
+    def test_astar_inconsistent_heuristic_stays_optimal(self):
+        # Every estimate is below the true distance to node 6, but 2 looks much closer than 4 so 1 is
+        # first reached the long way round and has to be expanded again
+        graph = [[(1, 10), [2, 4]], [(14, 8), [2, 3, 4, 5]], [(19, 2), [0, 1]], [(14, 19), [1, 6]],
+                 [(16, 18), [0, 1]], [(18, 5), [1]], [(7, 1), [3]]]
+        estimates = [33, 21, 15, 13, 37, 9, 0]
+        path = search(graph, 0, 6, "astar", heuristic=lambda graph, goal: estimates)
+        self.assertEqual(path, search(graph, 0, 6, "dijkstra"))
+        self.assertAlmostEqual(get_path_length(graph, path), get_path_length(graph, [0, 4, 1, 3, 6]), delta=1e-9)
+
+    # Bidirectional searches
+    def test_bidirectional_bfs_same_length(self):
+        graphs = graph_data.graph_data + perm_test_graph_data.perm_test_graph_data + [generate_graph(100, seed=5)]
+        for graph in graphs:
+            edges = compile_graph(graph)
+            for start in range(0, len(graph), 7):
+                for goal in range(len(graph)):
+                    forward_path = search(graph, start, goal, "bfs")
+                    path = search(graph, start, goal, "bidirectional_bfs")
+                    self.assertEqual(len(path), len(forward_path), f"Bidirectional BFS {start} -> {goal} length changed")
+                    for i in range(len(path) - 1):
+                        self.assertTrue(edges.has_edge(path[i], path[i + 1]), "Bidirectional BFS should only move to a neighbor")
+
+    def test_bidirectional_dijkstra_same_cost(self):
+        graphs = graph_data.graph_data + perm_test_graph_data.perm_test_graph_data + [generate_graph(100, seed=5)]
+        for graph in graphs:
+            for start in range(0, len(graph), 7):
+                for goal in range(len(graph)):
+                    forward_path = search(graph, start, goal, "dijkstra")
+                    path = search(graph, start, goal, "bidirectional_dijkstra")
+                    self.assertEqual(bool(path), bool(forward_path), f"Bidirectional Dijkstra {start} -> {goal} reachability changed")
+                    if path:
+                        self.assertEqual((path[0], path[-1]), (start, goal))
+                        self.assertAlmostEqual(get_path_length(graph, path), get_path_length(graph, forward_path), delta=1e-9)
+
+    def test_path_mode_flag(self):
+        self.assertEqual(len(get_bfs_path(mode="bidirectional")), len(get_bfs_path()))
+        graph = graph_data.graph_data[global_game_data.current_graph_index]
+        self.assertAlmostEqual(get_path_length(graph, [0] + get_dijkstra_path(mode="bidirectional")),
+                               get_path_length(graph, [0] + get_dijkstra_path()), delta=1e-9)
+
+    # Shared shortest-path trees
+    def test_single_pass_dijkstra_same_cost(self):
+        for graph_index, graph in enumerate(graph_data.graph_data):
+            global_game_data.current_graph_index = graph_index
+            for target_node in range(1, len(graph) - 1):
+                global_game_data.target_node[graph_index] = target_node
+                path = get_dijkstra_path(mode="single_pass")
+                self.assertIn(target_node, path, "Single pass route should include the target node")
+                self.assertEqual(path[-1], len(graph) - 1, "Single pass route should end at the exit node")
+                self.assertAlmostEqual(get_path_length(graph, [0] + path), get_path_length(graph, [0] + get_dijkstra_path()),
+                                       delta=1e-9, msg=f"Single pass route on graph {graph_index} should be as short")
+
+    def test_batched_dijkstra_routes(self):
+        graph = generate_graph(900, seed=2)
+        routes = [(start, target, exit_node) for start in [0, 31, 450] for target in [100, 500, 777]
+                  for exit_node in [899, 250]]
+        batch_stats = {}
+        paths = get_dijkstra_paths(graph, routes, stats=batch_stats)
+        separate_stats = {}
+        for (start, target, exit_node), path in zip(routes, paths):
+            start_to_target = search(graph, start, target, "dijkstra", stats=separate_stats)
+            target_to_exit = search(graph, target, exit_node, "dijkstra", stats=separate_stats)
+            self.assertAlmostEqual(get_path_length(graph, [start] + path),
+                                   get_path_length(graph, start_to_target) + get_path_length(graph, target_to_exit), delta=1e-6)
+        self.assertEqual(paths, [find_path(graph, *route) for route in routes], "Shared trees should give the same routes")
+        self.assertLess(batch_stats["expanded"], separate_stats["expanded"] / 3, "Routes should share search trees")
+        # One tree per target serves both legs of every route through it
+        single_pass_stats = {}
+        single_pass_paths = get_dijkstra_paths(graph, routes, stats=single_pass_stats, single_pass=True)
+        for (start, _, _), path, single_pass_path in zip(routes, paths, single_pass_paths):
+            self.assertAlmostEqual(get_path_length(graph, [start] + single_pass_path), get_path_length(graph, [start] + path), delta=1e-6)
+        self.assertLess(single_pass_stats["expanded"], separate_stats["expanded"] / 4, "Routes should share search trees")
+
+    def test_batched_dijkstra_matches_routes_on_ties(self):
+        # On an exact grid many routes are equally short, shared trees must still pick the same ones
+        graph = generate_graph(100, seed=1, diagonal_chance=0.5, jitter=0)
+        routes = [(start, target, len(graph) - 1) for start in [0, 7, 55] for target in range(1, len(graph), 6)]
+        for (start, target, exit_node), path in zip(routes, get_dijkstra_paths(graph, routes)):
+            self.assertEqual(path, find_path(graph, start, target, exit_node, "dijkstra"))
+            single_pass = find_path(graph, start, target, exit_node, "dijkstra", mode="single_pass")
+            self.assertAlmostEqual(get_path_length(graph, [start] + single_pass), get_path_length(graph, [start] + path), delta=1e-9)
+        tie_graph = [[(0, 0), [1, 2]], [(1, 0), [0, 2]], [(2, 0), [0, 1, 3]], [(3, 0), [2]]]
+        self.assertEqual(get_dijkstra_paths(tie_graph, [(0, 2, 3)]), [[1, 2, 3]])
+
+    def test_batched_dijkstra_directed_graph(self):
+        # Graph 4 has one way edges, legs then come from one tree per distinct source and match the forward search
+        graph = graph_data.graph_data[4]
+        routes = [(0, target, len(graph) - 1) for target in range(1, len(graph) - 1)]
+        for (_, target, _), path in zip(routes, get_dijkstra_paths(graph, routes)):
+            global_game_data.current_graph_index = 4
+            global_game_data.target_node[4] = target
+            self.assertEqual(path, get_dijkstra_path())
+
+    # Shared search core
+    def test_search_matches_path_copying(self):
+        # The parent-pointer core must return exactly the paths the path-copying searches returned
+        graphs = graph_data.graph_data + [generate_graph(400, seed=3)]
+        for graph in graphs:
+            for strategy in ["dfs", "bfs", "dijkstra"]:
+                for start in [0, len(graph) // 2]:
+                    for goal in range(len(graph)):
+                        self.assertEqual(search(graph, start, goal, strategy),
+                                         reference_search(graph, start, goal, strategy),
+                                         f"{strategy} path {start} -> {goal} changed")
+
+    def test_search_matches_path_copying_on_ties(self):
+        # Equally short paths used to be ordered by the whole path, which ends in the node reached
+        graph = [[(0, 0), [1, 2]], [(1, 0), [0, 2]], [(2, 0), [0, 1, 3]], [(3, 0), [2]]]
+        self.assertEqual(search(graph, 0, 2, "dijkstra"), [0, 1, 2])
+        self.assertEqual(find_path(graph, 0, 2, 3), [1, 2, 3])
+        for seed in range(3):
+            graph = generate_graph(100, seed=seed, diagonal_chance=0.5, jitter=0)
+            for start in range(0, len(graph), 11):
+                for goal in range(len(graph)):
+                    self.assertEqual(search(graph, start, goal, "dijkstra"), reference_search(graph, start, goal, "dijkstra"),
+                                     f"Dijkstra path {start} -> {goal} changed on exact grid {seed}")
+
+    def test_search_unreachable_goal(self):
+        graph = perm_test_graph_data.perm_test_graph_data[0]
+        for strategy in ["dfs", "bfs", "dijkstra"]:
+            self.assertEqual(search(graph, 5, 0, strategy), [], f"{strategy} should not find a path out of a dead end")
+
+    # Compiled graph
+    def test_compiled_graph_matches_nested_lists(self):
+        graph = graph_data.graph_data[2]
+        compiled = compile_graph(graph)
+        self.assertIs(compile_graph(graph), compiled, "Compiled graph should be cached per graph")
+        self.assertEqual(len(compiled), len(graph))
+        for node, graph_point in enumerate(graph):
+            self.assertEqual(list(compiled.neighbors(node)), graph_point[1], f"Neighbors of {node} changed")
+            self.assertEqual(compiled[node][0], graph_point[0], f"Coordinates of {node} changed")
+
+    def test_path_functions_see_adjacency_edits_in_place(self):
+        graph = [[graph_point[0], list(graph_point[1])] for graph_point in graph_data.graph_data[2]]
+        path = get_bfs_path(graph)
+        # Cut the first edge of the route in both directions, in place, and swap two neighbors of node 0
+        graph[0][1].remove(path[0])
+        graph[path[0]][1].remove(0)
+        graph[0][1].reverse()
+        fresh = [[graph_point[0], list(graph_point[1])] for graph_point in graph]
+        for algorithm in ["dfs", "bfs", "dijkstra", "astar"]:
+            self.assertEqual(find_path(graph, 0, 5, 23, algorithm), find_path(fresh, 0, 5, 23, algorithm), algorithm)
+        self.assertEqual(get_bfs_path(graph), get_bfs_path(fresh))
+        self.assertTrue(compile_graph(graph).matches(fresh))
+        self.assertEqual(list(compile_graph(graph).neighbors(0)), graph[0][1])
+
+    def test_weighted_paths_see_moved_nodes(self):
+        graph = [[(0, 0), [1, 2]], [(1, 1), [0, 3]], [(1, -2), [0, 3]], [(2, 0), [1, 2]]]
+        compiled = compile_graph(graph)
+        for algorithm in ["dijkstra", "astar"]:
+            self.assertEqual(find_path(graph, 0, 3, 3, algorithm), [1, 3])
+        weights = compiled.weights_np.copy()
+        graph[1][0] = (1, 5)
+        for algorithm in ["dijkstra", "astar"]:
+            self.assertEqual(find_path(graph, 0, 3, 3, algorithm), [2, 3], algorithm)
+        self.assertEqual(get_dijkstra_paths(graph, [(0, 3, 3)]), [[2, 3]])
+        # Moving a node keeps the compiled graph and only recomputes its weights
+        self.assertIs(compile_graph(graph), compiled)
+        self.assertFalse(np.array_equal(compiled.weights_np, weights))
+        self.assertTrue(compiled.matches(graph))
+
+    def test_paths_accept_compiled_graph(self):
+        graph = graph_data.graph_data[global_game_data.current_graph_index]
+        compiled = CompiledGraph(graph)
+        self.assertEqual(get_dfs_path(compiled), get_dfs_path())
+        self.assertEqual(get_bfs_path(compiled), get_bfs_path())
+        self.assertEqual(get_dijkstra_path(compiled), get_dijkstra_path())
+        self.assertEqual(has_ham_cycle(compiled), has_ham_cycle(graph))
+        dist, _ = floyd_warshall(CompiledGraph(graph_data.graph_data[1]))
+        self.assertAlmostEqual(dist[0][3], get_path_length(graph_data.graph_data[1], [0, 1, 2, 3]), delta=1e-9)
+
+    def test_adjacency_bitsets(self):
+        graph = generate_graph(400, seed=3)
+        compiled = CompiledGraph(graph)
+        for node, graph_point in enumerate(graph):
+            self.assertEqual(compiled.adjacency_bits()[node], sum(1 << neighbor for neighbor in graph_point[1]))
+            for other_node in range(0, len(graph), 7):
+                self.assertEqual(compiled.has_edge(node, other_node), other_node in graph_point[1])
+            other_node = graph_point[1][0]
+            self.assertEqual(compiled.common_neighbors(node, other_node),
+                             sorted(set(graph_point[1]) & set(graph[other_node][1])))
+
+    def test_route_postconditions_do_not_build_bitsets(self):
+        graph = generate_graph(300, seed=4)
+        compiled = CompiledGraph(graph)
+        for algorithm in ["dfs", "bfs", "dijkstra", "astar"]:
+            path = find_path(compiled, 0, 150, len(graph) - 1, algorithm)
+            self.assertTrue(path)
+            self.assertTrue(all(compiled.lists_edge(a, b) for a, b in zip([0] + path, path)))
+        self.assertFalse(compiled.lists_edge(0, 0))
+        self.assertIsNone(compiled._adjacency_bits, "Checking a route should not build the bitsets")
+
+    def test_has_edge_without_bitsets_on_large_graphs(self):
+        graph = generate_graph(400, seed=3)
+        limit = compiled_graph.bitset_node_limit
+        compiled_graph.bitset_node_limit = 100
+        try:
+            compiled = CompiledGraph(graph)
+            self.assertTrue(compiled.has_edge(0, 1))
+            self.assertFalse(compiled.has_edge(0, len(graph) - 1))
+            self.assertIsNone(compiled._adjacency_bits, "Large graphs should not build bitsets for edge tests")
+        finally:
+            compiled_graph.bitset_node_limit = limit
+
+    def test_edge_weight_table(self):
+        graph = graph_data.graph_data[2]
+        compiled = CompiledGraph(graph)
+        for node, graph_point in enumerate(graph):
+            for edge in range(compiled.offsets[node], compiled.offsets[node + 1]):
+                neighbor = compiled.indices[edge]
+                self.assertEqual(compiled.weights[edge], calculate_distance(graph_point[0], graph[neighbor][0]),
+                                 f"Weight of {node} -> {neighbor} should match calculate_distance")
+
+    def test_edge_weights_invalidated_on_move(self):
+        # Two routes 0 -> 1 -> 3 and 0 -> 2 -> 3, moving node 1 far away makes the other route shorter
+        compiled = CompiledGraph([[(0, 0), [1, 2]], [(1, 1), [0, 3]], [(1, -2), [0, 3]], [(2, 0), [1, 2]]])
+        self.assertEqual(search(compiled, 0, 3, "dijkstra"), [0, 1, 3])
+        compiled.set_node_coordinates(1, (1, 10))
+        self.assertEqual(search(compiled, 0, 3, "dijkstra"), [0, 2, 3], "Weights should follow moved coordinates")
+
     # Floyd-Warshall Tests
     def test_floyd_warshall_correct_distances(self):
         # Define a simple graph as adjacency matrix
@@ -244,5 +592,559 @@ class TestPathFinding(unittest.TestCase):
                             msg=f"Path weight mismatch for {i} -> {j}"
                         )
         
+    def test_floyd_warshall_numpy_backends(self):
+        graph_matrix = [
+            [0, 3, math.inf, 7],
+            [math.inf, 0, 1, math.inf],
+            [math.inf, math.inf, 0, 2],
+            [math.inf, math.inf, math.inf, 0]
+        ]
+        dist, parent = floyd_warshall(graph_matrix)
+        for backend in ["numpy", "blocked"]:
+            backend_dist, backend_parent = floyd_warshall(graph_matrix, backend=backend, block_size=3)
+            self.assertEqual(backend_dist.tolist(), dist, f"{backend} backend distances differ")
+            for i in range(len(graph_matrix)):
+                for j in range(len(graph_matrix)):
+                    self.assertEqual(reconstruct_path(backend_parent, i, j), reconstruct_path(parent, i, j),
+                                     f"{backend} backend path {i} -> {j} differs")
+
+    def test_floyd_warshall_blocked_generated_graph(self):
+        compiled = compile_graph(generate_graph(150, seed=4))
+        dist, parent = floyd_warshall(compiled, backend="numpy")
+        blocked_dist, blocked_parent = floyd_warshall(compiled, backend="blocked", block_size=16)
+        self.assertTrue((abs(blocked_dist - dist) < 1e-9).all(), "Blocked distances should match")
+        for i, j in [(0, len(compiled) - 1), (17, 93), (140, 2)]:
+            path = reconstruct_path(blocked_parent, i, j)
+            self.assertEqual((path[0], path[-1]), (i, j))
+            self.assertAlmostEqual(get_path_length(compiled, path), dist[i][j], delta=1e-9)
+        
+    # Sparse all-pairs shortest paths
+    def test_johnson_matches_floyd_warshall(self):
+        adjacency_list = [
+            [(1, 4), (2, 1)],
+            [(2, 2), (3, 5)],
+            [(1, 1), (3, 8)],
+            [],
+        ]
+        dist, parent = all_pairs_shortest_paths(adjacency_list, mode="johnson")
+        expected_dist, expected_parent = all_pairs_shortest_paths(adjacency_list, mode="floyd_warshall")
+        self.assertEqual(dist, expected_dist, "Johnson distances should match Floyd-Warshall")
+        for i in range(len(adjacency_list)):
+            for j in range(len(adjacency_list)):
+                self.assertEqual(reconstruct_path(parent, i, j), reconstruct_path(expected_parent, i, j))
+
+    def test_johnson_negative_edges(self):
+        adjacency_list = [
+            [(1, 4), (2, 5)],
+            [(3, 3)],
+            [(1, -3)],
+            [],
+        ]
+        dist, parent = all_pairs_shortest_paths(adjacency_list, mode="johnson")
+        self.assertEqual(dist[0], [0, 2, 5, 5], "Johnson reweighting should handle negative edges")
+        self.assertEqual(reconstruct_path(parent, 0, 3), [0, 2, 1, 3])
+        with self.assertRaises(ValueError):
+            all_pairs_shortest_paths([[(1, 1)], [(0, -2)]], mode="johnson")
+
+    def test_apsp_mode_follows_density(self):
+        self.assertEqual(choose_apsp_mode(5000, 20000), "johnson", "Large sparse graphs should use Johnson")
+        self.assertEqual(choose_apsp_mode(500, 500 * 499), "floyd_warshall", "Dense graphs should use Floyd-Warshall")
+        compiled = compile_graph(generate_graph(120, seed=6))
+        dist, _ = all_pairs_shortest_paths(compiled, mode="johnson")
+        expected_dist, _ = floyd_warshall(compiled, backend="numpy")
+        self.assertTrue((abs(expected_dist - dist) < 1e-9).all(), "Johnson on a compiled graph should match Floyd-Warshall")
+
+    # Process pool engine
+    def test_parallel_engine_matches_sequential(self):
+        compiled = compile_graph(generate_graph(200, seed=7))
+        routes = [(start, (start * 7) % len(compiled), len(compiled) - 1) for start in range(0, len(compiled), 9)]
+        with ParallelEngine(compiled, workers=2, chunk_size=5) as engine:
+            dist, parent = engine.apsp()
+            paths = list(engine.dijkstra_paths(routes))
+        expected_dist, expected_parent = all_pairs_shortest_paths(compiled, mode="johnson")
+        self.assertEqual(dist, expected_dist, "Parallel rows should come back in source order")
+        self.assertEqual(parent, expected_parent)
+        self.assertEqual(paths, get_dijkstra_paths(compiled, routes), "Parallel routes should come back in input order")
+
+    def test_parallel_engine_starts_without_with_block(self):
+        graph = graph_data.graph_data[2]
+        engine = ParallelEngine(graph, workers=2)
+        try:
+            self.assertEqual(list(engine.dijkstra_paths([(0, 5, len(graph) - 1)])), get_dijkstra_paths(graph, [(0, 5, len(graph) - 1)]))
+            self.assertTrue(all(engine.map(worker_graph_is_shared, range(4))), "Workers should not copy the shared arrays")
+        finally:
+            engine.close()
+        self.assertIsNone(engine.executor)
+
+    def test_parallel_sjt_matches_sequential(self):
+        for graph in [graph_data.graph_data[1], graph_data.graph_data[4], perm_test_graph_data.perm_test_graph_data[0]]:
+            with ParallelEngine(graph, workers=2) as engine:
+                self.assertEqual(list(engine.sjt_ham_cycles(shards=7)), list(sjt_ham_cycles(graph)))
+
+    def test_sjt_ham_cycles_shards(self):
+        graph = graph_data.graph_data[4]
+        total = math.factorial(len(graph) - 2)
+        cycles = []
+        for start in range(0, total, 50000):
+            cycles.extend(sjt_ham_cycles(graph, start, 50000))
+        self.assertEqual(cycles, list(sjt_ham_cycles(graph)))
+
+    # Stored all-pairs results
+    def test_apsp_store_round_trip(self):
+        graph = graph_data.graph_data[2]
+        dist, parent = floyd_warshall(compile_graph(graph), backend="numpy")
+        edges = compile_graph(graph)
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertIsNone(apsp_store.load_apsp(graph, directory), "Nothing should be stored yet")
+            stored_dist, stored_parent = apsp_store.cached_apsp(graph, directory, backend="numpy", mode="floyd_warshall")
+            header_path = apsp_store.store_paths(graph, directory)[0]
+            modified = os.path.getmtime(header_path)
+            for i in range(len(graph)):
+                for j in range(len(graph)):
+                    self.assertAlmostEqual(float(stored_dist[i][j]), dist[i][j], delta=1e-3)
+                    # The float32 store can break ties between equally long routes the other way
+                    path = reconstruct_path(stored_parent, i, j)
+                    self.assertEqual(bool(path), bool(reconstruct_path(parent, i, j)))
+                    if path and i != j:
+                        self.assertEqual((path[0], path[-1]), (i, j))
+                        self.assertTrue(all(edges.has_edge(a, b) for a, b in zip(path, path[1:])))
+                        self.assertAlmostEqual(get_path_length(graph, path), dist[i][j], delta=1e-3)
+            # A second lookup (as from a restarted process) reuses the stored files
+            reloaded_dist, _ = apsp_store.cached_apsp(graph, directory)
+            self.assertIsInstance(reloaded_dist, apsp_store.np.memmap)
+            self.assertEqual(os.path.getmtime(header_path), modified, "Stored result should not be recomputed")
+            self.assertIsNone(apsp_store.load_apsp(graph_data.graph_data[3], directory), "Other graphs have their own key")
+
+    def test_apsp_store_floyd_warshall_runs_on_the_store_files(self):
+        graph = graph_data.graph_data[3]
+        dist, _ = floyd_warshall(compile_graph(graph), backend="numpy")
+        original = apsp_store.f_w.compiled_to_matrix
+        apsp_store.f_w.compiled_to_matrix = None
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                stored_dist, _ = apsp_store.cached_apsp(graph, directory, mode="floyd_warshall")
+                np.testing.assert_allclose(stored_dist, dist, atol=1e-3)
+            with tempfile.TemporaryDirectory() as directory:
+                johnson_dist, johnson_parent = apsp_store.cached_apsp(graph, directory, mode="johnson")
+                np.testing.assert_allclose(johnson_dist, dist, atol=1e-3)
+                self.assertEqual(johnson_parent.dtype, np.int32)
+                self.assertEqual(int(johnson_parent[0][0]), -1)
+        finally:
+            apsp_store.f_w.compiled_to_matrix = original
+        
+
+    # Path queries without game state
+    def test_find_path_matches_wrappers(self):
+        graph = graph_data.graph_data[global_game_data.current_graph_index]
+        target_node = global_game_data.target_node[global_game_data.current_graph_index]
+        exit_node = len(graph) - 1
+        self.assertEqual(find_path(graph, 0, target_node, exit_node, "dfs"), get_dfs_path())
+        self.assertEqual(find_path(graph, 0, target_node, exit_node, "bfs"), get_bfs_path())
+        self.assertEqual(find_path(graph, 0, target_node, exit_node), get_dijkstra_path())
+        self.assertEqual(find_path(graph, 0, target_node, exit_node, "astar", heuristic="zero"), get_astar_path())
+        path = find_path(graph, 0, target_node, exit_node, "random", rng=np.random.default_rng(2))
+        self.assertEqual(path, find_path(graph, 0, target_node, exit_node, "random", rng=np.random.default_rng(2)))
+
+    def test_find_path_in_threads(self):
+        graph = generate_graph(400, seed=9)
+        queries = [(start, target, len(graph) - 1, algorithm) for start in range(0, len(graph), 37)
+                   for target in range(1, len(graph), 53) for algorithm in ["bfs", "dijkstra", "astar"]]
+        expected = [find_path(graph, *query) for query in queries]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda query: find_path(graph, *query), queries))
+        self.assertEqual(results, expected)
+
+    # Path cache
+    def test_path_cache_hits_and_misses(self):
+        pathing.path_cache.clear()
+        graph = graph_data.graph_data[2]
+        for algorithm in ["dfs", "bfs", "dijkstra", "astar"]:
+            first_stats, second_stats = {}, {}
+            stats = first_stats if algorithm != "dfs" else None
+            first = cached_find_path(graph, 0, 5, 23, algorithm, stats=stats)
+            second = cached_find_path(graph, 0, 5, 23, algorithm, stats=second_stats if stats is not None else None)
+            self.assertEqual(first, find_path(graph, 0, 5, 23, algorithm))
+            self.assertEqual(second, first)
+            self.assertEqual(second_stats, first_stats, "Cached results should report the original expansions")
+        self.assertEqual((pathing.path_cache.misses, pathing.path_cache.hits), (4, 4))
+
+    def test_path_cache_sees_edited_graphs(self):
+        pathing.path_cache.clear()
+        graph = [[graph_point[0], list(graph_point[1])] for graph_point in graph_data.graph_data[2]]
+        path = cached_find_path(graph, 0, 5, 23)
+        # Cut the first edge of the route in both directions, in place
+        graph[0][1].remove(path[0])
+        graph[path[0]][1].remove(0)
+        fresh = [[graph_point[0], list(graph_point[1])] for graph_point in graph]
+        self.assertEqual(cached_find_path(graph, 0, 5, 23), find_path(fresh, 0, 5, 23))
+        self.assertNotEqual(cached_find_path(graph, 0, 5, 23)[0], path[0])
+        self.assertEqual(pathing.path_cache.misses, 2)
+
+    def test_path_cache_random_needs_seed(self):
+        pathing.path_cache.clear()
+        graph = graph_data.graph_data[2]
+        cached_find_path(graph, 0, 5, 23, "random")
+        self.assertEqual(len(pathing.path_cache), 0, "Unseeded random paths should not be cached")
+        path = cached_find_path(graph, 0, 5, 23, "random", seed=3)
+        self.assertEqual(path, find_path(graph, 0, 5, 23, "random", rng=np.random.default_rng(3)))
+        self.assertEqual(cached_find_path(graph, 0, 5, 23, "random", seed=3), path)
+        self.assertEqual(pathing.path_cache.hits, 1)
+
+    def test_path_cache_eviction(self):
+        cache = PathCache(max_entries=2)
+        for index in range(3):
+            cache.put(("graph", index), ((1, 2, 3), {}))
+        self.assertIsNone(cache.get(("graph", 0)), "Least recently used entry should be evicted")
+        self.assertEqual(cache.evictions, 1)
+        small = PathCache(max_bytes=1000)
+        small.put(("graph", 0), (tuple(range(10)), {}))
+        small.put(("graph", 1), (tuple(range(10)), {}))
+        self.assertLessEqual(small.bytes, 1000)
+        self.assertEqual(len(small), 1)
+
+    # Path query service
+    def test_path_service_batches_match_find_path(self):
+        graph = graph_data.graph_data[2]
+        requests = [{"id": index, "graph": "graph", "op": "path", "start": 0, "target": index % 22 + 1, "exit": 23,
+                     "algorithm": ["dijkstra", "bfs", "astar", "dfs"][index % 4]} for index in range(80)]
+
+        async def run():
+            service = PathService({"graph": graph})
+            await service.start()
+            responses = await asyncio.gather(*(service.submit(request) for request in requests),
+                                             service.submit({"id": "d", "graph": "graph", "op": "distance",
+                                                             "start": 0, "end": 23}),
+                                             service.submit({"id": "x", "graph": "other", "op": "path"}))
+            metrics = service.metrics()
+            await service.close()
+            return responses, metrics
+
+        responses, metrics = asyncio.run(run())
+        for request, response in zip(requests, responses):
+            self.assertEqual(response["id"], request["id"])
+            self.assertEqual(response["path"], find_path(graph, 0, request["target"], 23, request["algorithm"]))
+        dist, _ = all_pairs_shortest_paths(compile_graph(graph))
+        self.assertAlmostEqual(responses[-2]["distance"], dist[0][23], delta=1e-9)
+        self.assertIn("error", responses[-1])
+        self.assertEqual(metrics["requests"], 81)
+        self.assertLess(metrics["batches"], 81, "Requests for the same graph should be batched")
+
+    def test_path_service_bad_nodes_only_fail_their_own_request(self):
+        from path_service import run_batch
+        graph = compile_graph(graph_data.graph_data[2])
+        good = {"op": "path", "start": 0, "target": 5, "exit": 23}
+        bad = [dict(good, target=500), dict(good, target="5"), dict(good, target=-3), dict(good, start=True),
+               {"op": "distance", "start": 0, "end": 24}]
+        answers = run_batch(graph, [good, *bad, dict(good, target=7)])
+        self.assertEqual(answers[0], {"path": find_path(graph, 0, 5, 23)})
+        self.assertEqual(answers[-1], {"path": find_path(graph, 0, 7, 23)})
+        for answer in answers[1:-1]:
+            self.assertEqual(list(answer), ["error"])
+
+    def test_path_service_mode_without_algorithm_runs_dijkstra(self):
+        from path_service import run_batch
+        graph = compile_graph(graph_data.graph_data[2])
+        answers = run_batch(graph, [{"op": "path", "start": 0, "target": 5, "exit": 23, "mode": "bidirectional"}])
+        self.assertEqual(answers, [{"path": find_path(graph, 0, 5, 23, "dijkstra", mode="bidirectional")}])
+
+    def test_path_service_rejects_unhashable_graph_names(self):
+        async def run():
+            service = PathService({"graph": graph_data.graph_data[1]})
+            server = await service.serve("127.0.0.1", 0)
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+            writer.write(b'{"id": 1, "graph": ["graph"], "start": 0, "target": 2, "exit": 3}\n'
+                         b'{"id": 2, "graph": {"name": "graph"}}\n'
+                         b'{"id": 3, "graph": "graph", "start": 0, "target": 2, "exit": 3}\n')
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for _ in range(3)]
+            writer.close()
+            await service.close()
+            return responses
+
+        responses = sorted(asyncio.run(run()), key=lambda response: response["id"])
+        self.assertIn("error", responses[0])
+        self.assertIn("error", responses[1])
+        self.assertEqual(responses[2], {"id": 3, "path": find_path(graph_data.graph_data[1], 0, 2, 3)})
+
+    def test_path_service_queue_is_bounded(self):
+        async def run():
+            service = PathService({"graph": graph_data.graph_data[1]}, queue_size=2)
+            request = {"graph": "graph", "start": 0, "target": 1, "exit": 3}
+            await service.enqueue(request)
+            await service.enqueue(request)
+            # Without a dispatcher draining the queue the third request has to wait for room
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(service.enqueue(request), 0.05)
+            await service.close()
+
+        asyncio.run(run())
+
+    def test_path_service_over_tcp(self):
+        async def run():
+            service = PathService({"graph": graph_data.graph_data[1]})
+            server = await service.serve("127.0.0.1", 0)
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+            writer.write(b'{"id": 1, "graph": "graph", "start": 0, "target": 2, "exit": 3}\nnot json\n')
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for _ in range(2)]
+            writer.close()
+            await service.close()
+            return responses
+
+        responses = sorted(asyncio.run(run()), key=lambda response: response["id"] is None)
+        self.assertEqual(responses[0], {"id": 1, "path": find_path(graph_data.graph_data[1], 0, 2, 3)})
+        self.assertIn("error", responses[1])
+
+    # Headless evaluation
+    def test_headless_rows_match_path_functions(self):
+        graph = graph_data.graph_data[2]
+        saved = (global_game_data.current_graph_index, list(global_game_data.target_node))
+        rows = list(headless.evaluate_graph("graph", graph, ["bfs", "dijkstra", "random"], seed=4))
+        self.assertEqual((global_game_data.current_graph_index, global_game_data.target_node), saved,
+                         "Evaluation should leave the game state as it was")
+        self.assertEqual(len(rows), 3 * (len(graph) - 2))
+        for row in rows:
+            options = {"rng": np.random.default_rng(4)} if row["algorithm"] == "random" else {}
+            path = find_path(graph, 0, row["target"], len(graph) - 1, row["algorithm"], **options)
+            self.assertEqual(row["path_length"], len(path), f"{row['algorithm']} to {row['target']} changed")
+            if path:
+                self.assertAlmostEqual(row["cost"], get_path_length(graph, [0] + path), delta=1e-9)
+
+    def test_headless_loads_files_and_directories(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "one.json"), "w") as graph_file:
+                json.dump(graph_data.graph_data[1], graph_file)
+            with open(os.path.join(directory, "many.json"), "w") as graph_file:
+                json.dump(graph_data.graph_data[:2], graph_file)
+            graphs = list(headless.load_graphs([directory]))
+            self.assertEqual([name for name, _ in graphs], [os.path.join(directory, "many.json#0"),
+                                                            os.path.join(directory, "many.json#1"),
+                                                            os.path.join(directory, "one.json")])
+            self.assertEqual(graphs[2][1], graph_data.graph_data[1])
+            output = io.StringIO()
+            headless.write_rows(headless.evaluate_graph("one", graphs[2][1], ["dfs"]), output, "csv")
+            self.assertEqual(output.getvalue().splitlines()[0], ",".join(headless.fields))
+
+    def test_headless_does_not_import_pyglet(self):
+        script = "import sys, headless; headless.main(['--builtin', '--algorithms', 'bfs']); " \
+                 "sys.exit('pyglet' in sys.modules)"
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(len(result.stdout.splitlines()), sum(max(len(graph) - 2, 0) for graph in graph_data.graph_data))
+
+    def test_viewport_transform_is_cached_and_applies_to_arrays(self):
+        import config_data
+        import relative_display_functions
+        saved = global_game_data.current_graph_index, config_data.window_width
+        try:
+            global_game_data.current_graph_index = 2
+            transform = relative_display_functions.get_viewport_transform()
+            self.assertIs(relative_display_functions.get_viewport_transform(), transform)
+            lines = np.array([[x, y, x2, y2] for (x, y), _ in graph_data.graph_data[2]
+                              for x2, y2 in [graph_data.graph_data[2][-1][0]]], dtype=np.float64)
+            applied = transform.apply(lines)
+            self.assertEqual(applied.shape, lines.shape)
+            for row, original in zip(applied.tolist(), lines.tolist()):
+                self.assertAlmostEqual(row[0], relative_display_functions.get_relative_graph_x(original[0]))
+                self.assertAlmostEqual(row[1], relative_display_functions.get_relative_graph_y(original[1]))
+                self.assertAlmostEqual(row[2], transform.x(original[2]))
+                self.assertAlmostEqual(row[3], transform.y(original[3]))
+            config_data.window_width += 100
+            self.assertIsNot(relative_display_functions.get_viewport_transform(), transform)
+        finally:
+            global_game_data.current_graph_index, config_data.window_width = saved
+
+    def test_graph_redraws_only_what_changed(self):
+        import types
+        import config_data
+        from graph import Graph
+        from render_state import RenderState, FrameTimer
+        saved = (global_game_data.current_graph_index, global_game_data.current_player_index,
+                 list(global_game_data.player_objects), list(global_game_data.graph_paths), config_data.window_width)
+        try:
+            global_game_data.current_graph_index = 1
+            global_game_data.current_player_index = 0
+            players = [types.SimpleNamespace(current_objective=0, absolute_x=0, absolute_y=0)
+                       for _ in config_data.player_data]
+            global_game_data.player_objects[:] = players
+            global_game_data.graph_paths[:] = [[1, 2]] * len(players)
+            graph = Graph.__new__(Graph)
+            graph.render_state = RenderState()
+            graph.renderer = types.SimpleNamespace(delete=lambda: None)
+            calls = []
+            graph.resize_graph = lambda: calls.append("graph")
+            graph.draw_new_path_lines = lambda: calls.append("path")
+            graph.move_player_line = lambda transform: calls.append("player")
+            graph.update_graph()
+            graph.update_graph()
+            self.assertEqual(calls, ["graph", "path", "player"])
+            players[0].current_objective = 1
+            graph.update_graph()
+            global_game_data.current_player_index = 1
+            graph.update_graph()
+            config_data.window_width += 100
+            graph.update_graph()
+            self.assertEqual(calls[3:], ["path", "path", "graph", "path"])
+            graph.render_state.invalidate()
+            graph.update_graph()
+            self.assertEqual(calls[7:], ["graph", "path"])
+        finally:
+            (global_game_data.current_graph_index, global_game_data.current_player_index, players, paths,
+             config_data.window_width) = saved
+            global_game_data.player_objects[:] = players
+            global_game_data.graph_paths[:] = paths
+
+        timer = FrameTimer(window=3)
+        self.assertIsNone(timer.stats()["mean_ms"])
+        for _ in range(5):
+            with timer.measure():
+                pass
+        self.assertEqual(timer.stats()["frames"], 5)
+        self.assertEqual(len(timer.durations), 3)
+        self.assertLessEqual(timer.stats()["p50_ms"], timer.stats()["max_ms"])
+
+    def test_graph_renderer_buffers(self):
+        from graph_renderer import edge_quads, node_points
+        for graph in graph_data.graph_data:
+            compiled = compile_graph(graph)
+            pairs = {tuple(sorted((node, other))) for node in range(len(graph)) for other in graph[node][1]
+                     if node != other}
+            edges = compiled.undirected_edges()
+            self.assertEqual([tuple(edge) for edge in edges.tolist()], sorted(pairs))
+            self.assertEqual(len(node_points(compiled.coordinates)), 2 * len(graph))
+        points = np.array([[0.0, 0.0], [10.0, 0.0], [10.0, 0.0]])
+        quads = edge_quads(points[[0, 1]], points[[1, 2]], 4).reshape(2, 6, 2)
+        self.assertEqual(quads.dtype, np.float32)
+        # Two triangles covering the band two units either side of the segment
+        self.assertEqual(sorted(set(map(tuple, quads[0].tolist()))), [(0, -2), (0, 2), (10, -2), (10, 2)])
+        self.assertEqual(set(map(tuple, quads[1].tolist())), {(10, 0)})
+
+    def test_spatial_grid_matches_brute_force(self):
+        from spatial_grid import SpatialGrid
+        rng = np.random.default_rng(7)
+        for coordinates in [rng.random((2000, 2)) * 100, np.c_[np.arange(50.0), np.zeros(50)], np.zeros((3, 2)),
+                            compile_graph(graph_data.graph_data[-1]).coordinates]:
+            grid = SpatialGrid(coordinates)
+            self.assertLessEqual(grid.columns * grid.rows, len(coordinates) + 1)
+            for _ in range(100):
+                min_x, max_x = np.sort(rng.random(2) * 140 - 20).tolist()
+                min_y, max_y = np.sort(rng.random(2) * 140 - 20).tolist()
+                inside = (coordinates[:, 0] >= min_x) & (coordinates[:, 0] <= max_x) & \
+                         (coordinates[:, 1] >= min_y) & (coordinates[:, 1] <= max_y)
+                self.assertEqual(grid.query(min_x, min_y, max_x, max_y).tolist(), np.flatnonzero(inside).tolist())
+            self.assertEqual(grid.query(-math.inf, -math.inf, math.inf, math.inf).tolist(), list(range(len(coordinates))))
+
+    def test_zoom_keeps_point_under_pointer_and_narrows_visible_bounds(self):
+        import relative_display_functions
+        from graph_renderer import edges_in_bounds
+        saved = global_game_data.current_graph_index
+        try:
+            global_game_data.current_graph_index = 2
+            whole = relative_display_functions.get_viewport_transform()
+            point = graph_data.graph_data[2][3][0]
+            window_x, window_y = whole.x(point[0]), whole.y(point[1])
+            relative_display_functions.zoom_view(4, window_x, window_y)
+            zoomed = relative_display_functions.get_viewport_transform()
+            self.assertIsNot(zoomed, whole)
+            self.assertAlmostEqual(zoomed.x(point[0]), window_x)
+            self.assertAlmostEqual(zoomed.y(point[1]), window_y)
+            compiled = compile_graph(graph_data.graph_data[2])
+            visible = relative_display_functions.ViewportTransform.visible_bounds
+            min_x, min_y, max_x, max_y = visible(zoomed)
+            self.assertTrue(min_x <= point[0] <= max_x and min_y <= point[1] <= max_y)
+            all_bounds = visible(whole)
+            self.assertTrue(all(all_bounds[0] <= x <= all_bounds[2] and all_bounds[1] <= y <= all_bounds[3]
+                                for x, y in compiled.coordinates.tolist()))
+            self.assertLess(max_x - min_x, (all_bounds[2] - all_bounds[0]) / 3)
+            edges = compiled.undirected_edges()
+            ends = compiled.coordinates[edges]
+            self.assertTrue(edges_in_bounds(ends.min(axis=1), ends.max(axis=1), all_bounds).all())
+            relative_display_functions.pan_view(10, -5)
+            self.assertAlmostEqual(relative_display_functions.get_relative_graph_x(point[0]), window_x + 10)
+        finally:
+            relative_display_functions.reset_view()
+            global_game_data.current_graph_index = saved
+
+    def test_simulation_matches_player_by_player_updates(self):
+        from simulation import Simulation
+        graph = graph_data.graph_data[2]
+        paths = [find_path(graph, 0, 5, len(graph) - 1, algorithm) for algorithm in ["dfs", "bfs", "dijkstra"]]
+        paths.insert(1, [])
+        speed, dt = 3000.0, 1 / 120
+        simulation = Simulation(speed, dt)
+        simulation.load(compile_graph(graph).coordinates, paths)
+        # The scalar per player movement of the old Player.update, players updated one after another
+        players = [{"x": graph[0][0][0], "y": graph[0][0][1], "objective": 0, "distance": 0, "visited": set()}
+                   for _ in paths]
+        current = 0
+        turns = []
+        for _ in range(2000):
+            for index, player in enumerate(players):
+                last_x, last_y = player["x"], player["y"]
+                if current < 0 or current >= len(players):
+                    current = 0
+                    for other in players:
+                        other.update(x=graph[0][0][0], y=graph[0][0][1], objective=0, distance=0, visited=set())
+                    break
+                if current == index and player["objective"] >= len(paths[index]):
+                    player["objective"] = 0
+                    current += 1
+                if player["objective"] >= 0 and current == index:
+                    target_x, target_y = graph[paths[index][player["objective"]]][0]
+                    difference_in_x, difference_in_y = target_x - player["x"], target_y - player["y"]
+                    difference = math.sqrt(pow(difference_in_x, 2) + pow(difference_in_y, 2))
+                    change_in_x = difference_in_x / difference * speed * dt if difference > 0 else 0
+                    change_in_y = difference_in_y / difference * speed * dt if difference > 0 else 0
+                    if player["x"] == target_x or player["x"] < target_x < player["x"] + change_in_x or \
+                            player["x"] + change_in_x < target_x < player["x"]:
+                        player["x"] = target_x
+                    else:
+                        player["x"] = player["x"] + change_in_x
+                    if player["y"] == target_y or player["y"] < target_y < player["y"] + change_in_y or \
+                            player["y"] + change_in_y < target_y < player["y"]:
+                        player["y"] = target_y
+                    else:
+                        player["y"] = player["y"] + change_in_y
+                    player["visited"].add(paths[index][player["objective"]])
+                    if player["x"] == target_x and player["y"] == target_y:
+                        player["objective"] += 1
+                player["distance"] += math.sqrt(math.pow(last_x - player["x"], 2) + math.pow(last_y - player["y"], 2))
+            simulation.step()
+            turns.append(current)
+            self.assertEqual(simulation.current, current)
+            self.assertEqual(simulation.positions.tolist(), [[player["x"], player["y"]] for player in players])
+            self.assertEqual(simulation.objectives.tolist(), [player["objective"] for player in players])
+            self.assertEqual(simulation.distances.tolist(), [player["distance"] for player in players])
+            self.assertEqual(simulation.visited_counts.tolist(), [len(player["visited"]) for player in players])
+            self.assertEqual([simulation.visited_nodes(index) for index in range(len(players))],
+                             [player["visited"] for player in players])
+        # Every player had a turn (the one without a path is skipped) and the relay started over
+        self.assertEqual(set(turns), {0, 2, 3, 4})
+        self.assertTrue(any(later < earlier for earlier, later in zip(turns, turns[1:])))
+
+    def test_simulation_races_all_players_at_a_fixed_timestep(self):
+        from simulation import Simulation
+        graph = graph_data.graph_data[-1]
+        paths = [find_path(graph, 0, target, len(graph) - 1, "dijkstra") for target in range(1, len(graph) - 1)] * 20
+        simulation = Simulation(500.0, 1 / 100, relay=False)
+        simulation.load(compile_graph(graph).coordinates, paths)
+        # Frame times that are not multiples of the timestep still run whole steps only
+        self.assertEqual(simulation.advance(0.025), 2)
+        self.assertEqual(simulation.advance(0.005), 1)
+        self.assertEqual(simulation.steps, 3)
+        while (simulation.objectives < simulation.lengths).any():
+            simulation.advance(1 / 60)
+        self.assertEqual(simulation.positions.tolist(), [list(graph[-1][0])] * len(paths))
+        for player, path in enumerate(paths):
+            self.assertAlmostEqual(simulation.distances[player], get_path_length(graph, [0] + path), delta=1e-6)
+            self.assertEqual(simulation.visited_counts[player], len(set(path)))
+        # Visited nodes are tracked per path position, nothing grows with players x nodes
+        self.assertEqual(simulation.distinct_counts.shape, simulation.paths.shape)
+        # A long stall only runs max_steps steps
+        steps = simulation.steps
+        self.assertEqual(simulation.advance(10), simulation.max_steps)
+        self.assertEqual(simulation.steps, steps + simulation.max_steps)
+        
 if __name__ == '__main__':
     unittest.main()